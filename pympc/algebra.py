@@ -1,4 +1,5 @@
 import numpy as np
+import scipy.linalg as linalg
 from copy import copy
 
 def nullspace_basis(A):
@@ -63,4 +64,33 @@ def normalize_inequalities(A, b, tol=1e-7):
             if norm_factor > tol:
                 A[i,:] = A[i,:]/norm_factor
                 b[i] = b[i]/norm_factor
-        return A, b
\ No newline at end of file
+        return A, b
+
+def cholesky_append(L, k, kappa, tol=1.e-9):
+    """
+    Given the lower triangular Cholesky factor L of the matrix K, returns the factor of [[K, k], [k', kappa]] (rank-one update).
+    Returns None if the new matrix is not (numerically) positive definite.
+    """
+    n = L.shape[0]
+    l = np.zeros((n, 1))
+    if n > 0:
+        l = linalg.solve_triangular(L, k, lower=True)
+    d_squared = kappa - l.T.dot(l)[0,0]
+    if d_squared <= tol*kappa:
+        return None
+    L_new = np.zeros((n+1, n+1))
+    L_new[:n,:n] = L
+    L_new[n,:n] = l.flatten()
+    L_new[n,n] = np.sqrt(d_squared)
+    return L_new
+
+def cholesky_delete(L, i):
+    """
+    Given the lower triangular Cholesky factor L of the matrix K, returns the factor of K without its ith row and column (rank-one downdate, the triangular structure is restored with Givens rotations).
+    """
+    L = np.delete(L, i, 0)
+    for j in range(i, L.shape[0]):
+        r = np.hypot(L[j,j], L[j,j+1])
+        c, s = L[j,j]/r, L[j,j+1]/r
+        [L[j:,j], L[j:,j+1]] = [c*L[j:,j] + s*L[j:,j+1], - s*L[j:,j] + c*L[j:,j+1]]
+    return L[:,:-1]
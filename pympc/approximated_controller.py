@@ -4,7 +4,7 @@ from geometry.polytope import Polytope
 from pympc.control import upload_HybridModelPredictiveController
 from pympc.geometry.inner_approximation_polytope_projection import InnerApproximationOfPolytopeProjection, upload_InnerApproximationOfPolytopeProjection
 from optimization.gurobi import read_status
-from optimization.parametric_programs import upload_ParametricQP
+from optimization.parametric_programs import ParametricQP, upload_ParametricQP
 import h5py
 import ast
 
@@ -18,7 +18,7 @@ class FeasibleSetLibrary:
             self.mode_sequences = mode_sequences
         return
 
-    def sample_policy(self, n_samples, check_sample_function=None):
+    def sample_policy(self, n_samples, check_sample_function=None, sampling_polytope=None):
 
         # initialize count
         n_rejected = 0
@@ -29,7 +29,7 @@ class FeasibleSetLibrary:
         # build library
         for i in range(n_samples):
             print('Sample ' + str(i) + ': ')
-            x = self._random_sample(check_sample_function)
+            x = self.controller.sys.random_state(check_sample_function, sampling_polytope=sampling_polytope)
 
             # reject sample if already covered
             if self._sampling_rejection(x):
@@ -88,15 +88,6 @@ class FeasibleSetLibrary:
 
         return
 
-    def _random_sample(self, check_sample_function=None):
-        x = np.random.rand(self.controller.sys.n_x, 1)
-        x = np.multiply(x, (self.controller.sys.x_max - self.controller.sys.x_min)) + self.controller.sys.x_min
-        if check_sample_function is not None:
-            while not check_sample_function(x):
-                x = np.random.rand(self.controller.sys.n_x, 1)
-                x = np.multiply(x, (self.controller.sys.x_max - self.controller.sys.x_min)) + self.controller.sys.x_min
-        return x
-
     def _sampling_rejection(self, x):
         for mode_sequence in self.mode_sequences.values():
             if mode_sequence['feasible_set'].applies_to(x):
@@ -186,6 +177,7 @@ class ApproximatedHybridModelPredictiveController:
     def __init__(self, library, terminal_mode):
         self.library = library
         self.shifted_qps = self._programs_shifted_mode_sequences(terminal_mode)
+        self._active_sets = dict()
         return
 
     def _programs_shifted_mode_sequences(self, terminal_mode):
@@ -203,7 +195,7 @@ class ApproximatedHybridModelPredictiveController:
         n_u = self.library.controller.sys.n_u
         N = self.library.controller.N
         if first_mode_sequence is not None:
-            input_sequence, cost = self.shifted_qps[first_mode_sequence].solve(x)
+            input_sequence, cost = self._solve(self.shifted_qps[first_mode_sequence], first_mode_sequence, x)
             input_sequence = [input_sequence[i*n_u:(i+1)*n_u,:] for i in range(N)]
             mode_sequence = first_mode_sequence
         else:
@@ -218,7 +210,7 @@ class ApproximatedHybridModelPredictiveController:
 
         # solve qps
         for feasible_mode_sequence in feasible_mode_sequences:
-            new_input_sequence, new_cost = self.library.mode_sequences[feasible_mode_sequence]['program'].solve(x)
+            new_input_sequence, new_cost = self._solve(self.library.mode_sequences[feasible_mode_sequence]['program'], feasible_mode_sequence, x)
             if new_cost < cost or np.isnan(cost):
                 cost = new_cost
                 input_sequence = [new_input_sequence[i*n_u:(i+1)*n_u,:] for i in range(N)]
@@ -226,6 +218,17 @@ class ApproximatedHybridModelPredictiveController:
 
         return input_sequence, cost, mode_sequence
 
+    def _solve(self, program, mode_sequence, x):
+        """
+        Solves the program of the given mode sequence; QPs are solved with the dual active-set solver, warm started from the active set found the last time the same mode sequence was solved.
+        """
+        if not isinstance(program, ParametricQP):
+            return program.solve(x)
+        argmin, cost, active_set = program.solve_dual_active_set(x, self._active_sets.get(mode_sequence))
+        if active_set is not None:
+            self._active_sets[mode_sequence] = active_set
+        return argmin, cost
+
     def feedback(self, x, first_mode_sequence=None, max_programs=None):
         input_sequence, cost, mode_sequence = self.feedforward(x, first_mode_sequence, max_programs)
         return input_sequence[0], mode_sequence
@@ -20,7 +20,7 @@ class PolicySampler:
             self.qp_library = qp_library
         return
 
-    def sample_policy(self, n_samples, check_sample_function=None, sample_origin=False):
+    def sample_policy(self, n_samples, check_sample_function=None, sample_origin=False, sampling_polytope=None):
 
         # initialize count
         n_rejected = 0
@@ -33,7 +33,7 @@ class PolicySampler:
             if i == 0 and sample_origin:
                 x = np.zeros((self.controller.sys.n_x, 1))
             else:
-                x = self._random_sample(check_sample_function)
+                x = self.controller.sys.random_state(check_sample_function, sampling_polytope=sampling_polytope)
 
             # reject sample if already covered
             if self._sampling_rejection(x):
@@ -67,15 +67,6 @@ class PolicySampler:
 
         return
 
-    def _random_sample(self, check_sample_function=None):
-        x = np.random.rand(self.controller.sys.n_x, 1)
-        x = np.multiply(x, (self.controller.sys.x_max - self.controller.sys.x_min)) + self.controller.sys.x_min
-        if check_sample_function is not None:
-            while not check_sample_function(x):
-                x = np.random.rand(self.controller.sys.n_x, 1)
-                x = np.multiply(x, (self.controller.sys.x_max - self.controller.sys.x_min)) + self.controller.sys.x_min
-        return x
-
     def _sampling_rejection(self, x):
         for qp in self.qp_library.values():
             if qp.is_feasible(x):
@@ -5,10 +5,12 @@ import matplotlib.pyplot as plt
 import gurobipy as grb
 from contextlib import contextmanager
 from copy import copy
-from optimization.pnnls import linear_program
-from optimization.gurobi import read_status
+from optimization.pnnls import linear_program, linear_program_batch
+from optimization.gurobi import read_status, add_linear_constraints
 from optimization.parametric_programs import ParametricLP, ParametricQP
-from optimization.mpqpsolver import MPQPSolver, CriticalRegion
+from optimization.mpqpsolver import MPQPSolver, CriticalRegion, merge_critical_regions
+from optimization.mplpsolver import MPLPSolver
+from explicit_solution import ExplicitSolution
 from dynamical_systems import AffineSystem, PieceWiseAffineSystem, upload_PieceWiseAffineSystem
 from algebra import clean_matrix, nullspace_basis, rangespace_basis
 from geometry.polytope import Polytope, LowerDimensionalPolytope
@@ -45,6 +47,10 @@ class ModelPredictiveController:
             self.X_N = X_N
         self.condense_program()
         self.critical_regions = None
+        self.explicit_solution = None
+        self.merged_critical_regions = None
+        self._previous_critical_region = None
+        self._previous_active_set = None
         return
 
     def condense_program(self):
@@ -73,43 +79,79 @@ class ModelPredictiveController:
         self.condensed_program.C_u = np.delete(self.condensed_program.C_u,intial_state_contraints, 0)
         self.condensed_program.C_x = np.delete(self.condensed_program.C_x,intial_state_contraints, 0)
         self.condensed_program.C = np.delete(self.condensed_program.C,intial_state_contraints, 0)
+        if self.objective_norm == 'two':
+            self.condensed_program.remove_linear_terms()
         return
 
-    def feedforward(self, x0):
+    def feedforward(self, x0, warm_start=False):
         """
         Given the state of the system, returns the optimal sequence of N inputs and the related cost.
+        For norm = 2 the QP is solved with the dual active-set solver (see ParametricQP.solve_dual_active_set()); if warm_start is True, the solver starts from the active set found at the previous call (in closed loop the active set barely changes from one step to the next).
         """
-        u_feedforward, cost = self.condensed_program.solve(x0)
+        if self.objective_norm == 'two':
+            active_set = self._previous_active_set if warm_start else None
+            u_feedforward, cost, active_set = self.condensed_program.solve_dual_active_set(x0, active_set)
+            if active_set is not None:
+                self._previous_active_set = active_set
+        else:
+            u_feedforward, cost = self.condensed_program.solve(x0)
         u_feedforward = [u_feedforward[self.sys.n_u*i:self.sys.n_u*(i+1),:] for i in range(self.N)]
         # if any(np.isnan(u_feedforward).flatten()):
         #     print('Unfeasible initial condition x_0 = ' + str(x0.tolist()))
         return u_feedforward, cost
 
-    def feedback(self, x0):
+    def feedback(self, x0, warm_start=False):
         """
         Returns the a single input vector (the first of feedforward(x0)).
         """
-        return self.feedforward(x0)[0][0]
+        return self.feedforward(x0, warm_start)[0][0]
 
-    def get_explicit_solution(self):
+    def get_explicit_solution(self, search_tree=False, n_processes=1, checkpoint_name=None, time_limit=None, region_of_interest=None, cache=None, statistics=False):
         """
-        (Only for controllers with norm = 2).
         Returns the partition of the state space in critical regions (explicit MPC solution).
-        Temporary fix: since the method remove_intial_state_contraints() modifies the variables of condensed_program, I have to call remove_linear_terms() again...
+        For norm = 2 the condensed mp-QP is solved with MPQPSolver, for norm = 1 the condensed mp-LP is solved with MPLPSolver (the options n_processes, checkpoint_name, time_limit, region_of_interest, cache and statistics are available only for norm = 2).
+        If search_tree is True, a binary search tree over the hyperplanes of the critical regions is built, so that the point location in feedforward_explicit() is logarithmic (and not linear) in the number of regions.
+        With n_processes > 1 the critical regions are computed in parallel (see MPQPSolver).
+        If checkpoint_name is provided, the exploration is periodically saved in checkpoint_name.hdf5 and resumed from there if the file already exists; if time_limit is provided the exploration stops after time_limit seconds and the flag explicit_solution_complete is False.
+        If region_of_interest (Polytope) is provided, only the states inside it are partitioned (see MPQPSolver).
+        If cache (CriticalRegionCache) is provided, the critical regions already computed for the same problem are read from the disk.
+        If statistics is True, the timings and the counters of the mp-QP solver are stored in explicit_solution_statistics (see SolverStatistics).
+        Temporary fix: since the method remove_intial_state_contraints() modifies the variables of condensed_program, I have to call remove_linear_terms() (or add_slack_variables()) again...
         """
-        self.condensed_program.remove_linear_terms()
-        mpqp_solution = MPQPSolver(self.condensed_program)
-        self.critical_regions = mpqp_solution.critical_regions
+        if self.objective_norm == 'one':
+            if n_processes > 1 or statistics or any(option is not None for option in [checkpoint_name, time_limit, region_of_interest, cache]):
+                raise ValueError('Options n_processes, checkpoint_name, time_limit, region_of_interest, cache and statistics are available only for norm = 2.')
+            self.condensed_program.add_slack_variables()
+            mplp_solution = MPLPSolver(self.condensed_program)
+            self.critical_regions = mplp_solution.critical_regions
+            self.explicit_solution_complete = True
+            self.explicit_solution_statistics = None
+        else:
+            self.condensed_program.remove_linear_terms()
+            mpqp_solution = MPQPSolver(self.condensed_program, n_processes, checkpoint_name, time_limit=time_limit, region_of_interest=region_of_interest, cache=cache, statistics=statistics)
+            self.critical_regions = mpqp_solution.critical_regions
+            self.explicit_solution_complete = mpqp_solution.complete
+            self.explicit_solution_statistics = mpqp_solution.statistics
+        self._previous_critical_region = None
+        self.merged_critical_regions = None
+        self.explicit_solution = ExplicitSolution.from_critical_regions(self.critical_regions, self.sys.n_u)
+        if search_tree:
+            self.critical_regions.build_search_tree()
         return
 
-    def feedforward_explicit(self, x0):
+    def feedforward_explicit(self, x0, warm_start=False):
         """
         Finds the critical region where the state x0 is, and returns the PWA feedforward.
+        If warm_start is True, the search starts from the critical region found at the previous call and walks across the violated facets (in closed loop the state rarely leaves the neighborhood of the previous region).
         """
         if self.critical_regions is None:
             raise ValueError('Explicit solution not available, call .get_explicit_solution()')
-        cr_x0 = self.critical_regions.lookup(x0)
+        start = None
+        if warm_start:
+            start = self._previous_critical_region
+        cr_x0 = self.critical_regions.lookup(x0, start)
         if cr_x0 is not None:
+            self._previous_critical_region = cr_x0
             u_feedforward = cr_x0.u_offset + cr_x0.u_linear.dot(x0)
             u_feedforward = [u_feedforward[self.sys.n_u*i:self.sys.n_u*(i+1),:] for i in range(self.N)]
             cost = .5*x0.T.dot(cr_x0.V_quadratic).dot(x0) + cr_x0.V_linear.dot(x0) + cr_x0.V_offset
@@ -120,11 +162,53 @@ class ModelPredictiveController:
             cost = np.nan
         return u_feedforward, cost
 
+    def feedforward_explicit_batch(self, x0s):
+        """
+        Evaluates the explicit solution for many states at once.
+
+        INPUTS:
+            x0s: states (n_points x n_x)
+
+        OUTPUTS:
+            indices: index of the critical region of each state (-1 if the state is unfeasible)
+            u_first: first input for each state (n_points x n_u)
+            u_feedforward: input sequence for each state (n_points x n_u*N)
+            cost: optimal value function for each state (n_points)
+        """
+        if self.explicit_solution is None:
+            raise ValueError('Explicit solution not available, call .get_explicit_solution()')
+        return self.explicit_solution.evaluate(x0s)
+
+    def export_explicit_solution(self, directory_name, full_sequence=True):
+        """
+        Writes the explicit solution in the directory directory_name in the flat format read by the runtime evaluator explicit_controller.ExplicitController (which imports only numpy).
+        If full_sequence is False only the gains of the first input are exported (enough for feedback()).
+        """
+        if self.explicit_solution is None:
+            raise ValueError('Explicit solution not available, call .get_explicit_solution()')
+        self.explicit_solution.save(directory_name, full_sequence)
+        return
+
+    def merge_critical_regions(self):
+        """
+        Merges the critical regions with the same first input whose union is convex (see merge_critical_regions() in optimization.mpqpsolver). The merged regions are then used by feedback_explicit().
+        """
+        if self.critical_regions is None:
+            raise ValueError('Explicit solution not available, call .get_explicit_solution()')
+        self.merged_critical_regions = merge_critical_regions(self.critical_regions, self.sys.n_u)
+        return
+
     def feedback_explicit(self, x0):
         """
         Returns the a single input vector (the first of feedforward_explicit(x0)).
+        If the critical regions have been merged (see merge_critical_regions()) the lookup is performed among the merged regions.
         """
-        return self.feedforward(x0)[0][0]
+        if self.merged_critical_regions is None:
+            return self.feedforward_explicit(x0)[0][0]
+        region_x0 = self.merged_critical_regions.lookup(x0)
+        if region_x0 is None:
+            return np.full((self.sys.n_u, 1), np.nan)
+        return region_x0.u_optimal(x0)
 
     def optimal_value_function(self, x0):
         """
@@ -140,21 +224,6 @@ class ModelPredictiveController:
             cost = np.nan
         return cost
 
-    # def group_critical_regions(self):
-    #     self.u_offset_list = []
-    #     self.u_linear_list = []
-    #     self.cr_families = []
-    #     for cr in self.critical_regions:
-    #         cr_family = np.where(np.isclose(cr.u_offset[0], self.u_offset_list))[0]
-    #         if cr_family and all(np.isclose(cr.u_linear[0,:], self.u_linear_list[cr_family[0]])):
-    #             self.cr_families[cr_family[0]].append(cr)
-    #         else:
-    #             self.cr_families.append([cr])
-    #             self.u_offset_list.append(cr.u_offset[0])
-    #             self.u_linear_list.append(cr.u_linear[0,:])
-    #     print 'Critical regions grouped in ', str(len(self.cr_families)), ' sets.'
-    #     return
-
 
 
 class HybridModelPredictiveController:
@@ -196,8 +265,8 @@ class HybridModelPredictiveController:
             for j, domain_j in enumerate(self.sys.domains):
                 M_ij = []
                 if i != j:
-                    for k in range(domain_i.lhs_min.shape[0]):
-                        sol = linear_program(-domain_i.lhs_min[k,:], domain_j.lhs_min, domain_j.rhs_min)
+                    sols = linear_program_batch(-domain_i.lhs_min.T, domain_j.lhs_min, domain_j.rhs_min)
+                    for k, sol in enumerate(sols):
                         M_ijk = (- sol.min - domain_i.rhs_min[k])[0]
                         M_ij.append(M_ijk)
                 M_ij = np.reshape(M_ij, (len(M_ij), 1))
@@ -222,12 +291,11 @@ class HybridModelPredictiveController:
             for domain_j in self.sys.domains:
                 M_ij = []
                 m_ij = []
+                sols = linear_program_batch(np.hstack((-lhs_i.T, lhs_i.T)), domain_j.lhs_min, domain_j.rhs_min)
                 for k in range(lhs_i.shape[0]):
-                    sol = linear_program(-lhs_i[k,:], domain_j.lhs_min, domain_j.rhs_min)
-                    M_ijk = (- sol.min + rhs_i[k])[0]
+                    M_ijk = (- sols[k].min + rhs_i[k])[0]
                     M_ij.append(M_ijk)
-                    sol = linear_program(lhs_i[k,:], domain_j.lhs_min, domain_j.rhs_min)
-                    m_ijk = (sol.min + rhs_i[k])[0]
+                    m_ijk = (sols[lhs_i.shape[0]+k].min + rhs_i[k])[0]
                     m_ij.append(m_ijk)
                 M_ij = np.reshape(M_ij, (len(M_ij), 1))
                 m_ij = np.reshape(m_ij, (len(m_ij), 1))
@@ -265,22 +333,24 @@ class HybridModelPredictiveController:
     def _linear_term(M, x, k, tol=1.e-9):
         expr_list = []
         for i in range(M.shape[0]):
-            expr = grb.LinExpr()
-            for j in range(M.shape[1]):
-                if np.abs(M[i,j]) > tol:
-                    expr.add(M[i,j] * x[k,j])
-            expr_list.append(expr)
+            nonzeros = np.where(np.abs(M[i,:]) > tol)[0]
+            expr_list.append(grb.LinExpr(M[i,nonzeros].tolist(), [x[k,j] for j in nonzeros]))
         return np.vstack(expr_list)
 
     @staticmethod
     def _quadratic_term(M, x, k, tol=1.e-9):
+        rows, cols = np.where(np.abs(M) > tol)
         expr = grb.QuadExpr()
-        for i in range(M.shape[0]):
-            for j in range(M.shape[1]):
-                if np.abs(M[i,j]) > tol:
-                    expr.add(x[k,i] * M[i,j] * x[k,j])
+        expr.addTerms(M[rows,cols].tolist(), [x[k,i] for i in rows], [x[k,j] for j in cols])
         return expr
 
+    @staticmethod
+    def _vector(x, k, n):
+        """
+        Returns the list of the Gurobi variables x[k,0], ..., x[k,n-1].
+        """
+        return [x[k,i] for i in range(n)]
+
     def _MIP_objective(self):
         if self.objective_norm == 'one':
             self._MILP_objective()
@@ -294,24 +364,19 @@ class HybridModelPredictiveController:
         self._phi = self._model.addVars(self.N+1, self.sys.n_x, name='phi')
         self._psi = self._model.addVars(self.N, self.sys.n_u, name='psi')
         self._model.update()
-        V = grb.LinExpr()
+        slacks = self._phi.values() + self._psi.values()
+        self._model.setObjective(grb.LinExpr([1.]*len(slacks), slacks))
         for k in range(self.N+1):
-            for i in range(self.sys.n_x):
-                V.add(self._phi[k,i])
+            Q = self.Q if k < self.N else self.P
+            I = np.eye(self.sys.n_x)
+            lhs = np.vstack((np.hstack((Q, -I)), np.hstack((-Q, -I))))
+            x_phi = self._vector(self._x, k, self.sys.n_x) + self._vector(self._phi, k, self.sys.n_x)
+            add_linear_constraints(self._model, lhs, x_phi, grb.GRB.LESS_EQUAL, np.zeros((2*self.sys.n_x,1)), tol=1.e-9)
         for k in range(self.N):
-            for i in range(self.sys.n_u):
-                V.add(self._psi[k,i])
-        self._model.setObjective(V)
-        for k in range(self.N):
-            for i in range(self.sys.n_x):
-                self._model.addConstr(self._phi[k,i] >= self._linear_term(self.Q[i:i+1,:], self._x, k)[0,0])
-                self._model.addConstr(self._phi[k,i] >= - self._linear_term(self.Q[i:i+1,:], self._x, k)[0,0])
-            for i in range(self.sys.n_u):
-                self._model.addConstr(self._psi[k,i] >= self._linear_term(self.R[i:i+1,:], self._u, k)[0,0])
-                self._model.addConstr(self._psi[k,i] >= - self._linear_term(self.R[i:i+1,:], self._u, k)[0,0])
-        for i in range(self.sys.n_x):
-            self._model.addConstr(self._phi[self.N,i] >= self._linear_term(self.P[i:i+1,:], self._x, self.N)[0,0])
-            self._model.addConstr(self._phi[self.N,i] >= - self._linear_term(self.P[i:i+1,:], self._x, self.N)[0,0])
+            I = np.eye(self.sys.n_u)
+            lhs = np.vstack((np.hstack((self.R, -I)), np.hstack((-self.R, -I))))
+            u_psi = self._vector(self._u, k, self.sys.n_u) + self._vector(self._psi, k, self.sys.n_u)
+            add_linear_constraints(self._model, lhs, u_psi, grb.GRB.LESS_EQUAL, np.zeros((2*self.sys.n_u,1)), tol=1.e-9)
         return
 
     def _MIQP_objective(self):
@@ -341,46 +406,49 @@ class HybridModelPredictiveController:
         for i in range(self.sys.n_sys):
             lhs = self.sys.domains[i].lhs_min
             rhs = clean_matrix(self.sys.domains[i].rhs_min)
+            M = np.hstack([M_domains[i][j] if j != i else np.zeros((lhs.shape[0],1)) for j in range(self.sys.n_sys)])
             for k in range(self.N):
-                expr = self._linear_term(lhs[:,:self.sys.n_x], self._x, k)
-                expr = expr + self._linear_term(lhs[:,self.sys.n_x:], self._u, k)
-                expr = expr - np.sum([M_domains[i][j]*self._d[k,j] for j in range(self.sys.n_sys) if j != i], axis=0)
-                expr = expr - rhs
-                self._model.addConstrs((expr[j,0] <= 0. for j in range(lhs.shape[0])))
+                x_u_d = self._vector(self._x, k, self.sys.n_x) + self._vector(self._u, k, self.sys.n_u) + self._vector(self._d, k, self.sys.n_sys)
+                add_linear_constraints(self._model, np.hstack((lhs, -M)), x_u_d, grb.GRB.LESS_EQUAL, rhs, tol=1.e-9)
         return
 
     def _dynamic_constraints(self):
         # clean bigMs from almost zero terms
         M_dynamics = [[clean_matrix(self._M_dynamics[i][j]) for j in range(self.sys.n_sys)] for i in range(self.sys.n_sys)]
         m_dynamics = [[clean_matrix(self._m_dynamics[i][j]) for j in range(self.sys.n_sys)] for i in range(self.sys.n_sys)]
+        I = np.eye(self.sys.n_x)
+        zeros = np.zeros((self.sys.n_x,1))
+
+        # the next state is the sum of the auxiliary variables z
         for k in range(self.N):
-            for j in range(self.sys.n_x):
-                expr = grb.LinExpr()
-                for i in range(self.sys.n_sys):
-                    expr.add(self._z[k,i,j])
-                self._model.addConstr(self._x[k+1,j] == expr)
+            x_z = self._vector(self._x, k+1, self.sys.n_x)
+            for i in range(self.sys.n_sys):
+                x_z += [self._z[k,i,j] for j in range(self.sys.n_x)]
+            add_linear_constraints(self._model, np.hstack([I] + [-I]*self.sys.n_sys), x_z, grb.GRB.EQUAL, zeros, tol=1.e-9)
+
+        # z is zero for the inactive modes
         for k in range(self.N):
             for i in range(self.sys.n_sys):
-                expr_M = M_dynamics[i][i]*self._d[k,i]
-                expr_m = m_dynamics[i][i]*self._d[k,i]
-                for j in range(self.sys.n_x):
-                    self._model.addConstr(self._z[k,i,j] <= expr_M[j,0])
-                    self._model.addConstr(self._z[k,i,j] >= expr_m[j,0])
+                z_d = [self._z[k,i,j] for j in range(self.sys.n_x)] + [self._d[k,i]]
+                lhs = np.vstack((np.hstack((I, -M_dynamics[i][i])), np.hstack((-I, m_dynamics[i][i]))))
+                add_linear_constraints(self._model, lhs, z_d, grb.GRB.LESS_EQUAL, np.vstack((zeros, zeros)), tol=1.e-9)
+
+        # z is equal to the next state for the active mode
         for i in range(self.sys.n_sys):
+            A = self.sys.affine_systems[i].A
+            B = self.sys.affine_systems[i].B
+            c = clean_matrix(self.sys.affine_systems[i].c)
+            M = np.hstack([M_dynamics[i][j] if j != i else zeros for j in range(self.sys.n_sys)])
+            m = np.hstack([m_dynamics[i][j] if j != i else zeros for j in range(self.sys.n_sys)])
+            lhs = np.vstack((np.hstack((A, B, -I, -M)), np.hstack((-A, -B, I, m))))
             for k in range(self.N):
-                expr = self._linear_term(self.sys.affine_systems[i].A, self._x, k)
-                expr = expr + self._linear_term(self.sys.affine_systems[i].B, self._u, k)
-                expr = expr + clean_matrix(self.sys.affine_systems[i].c)
-                expr_M = expr - np.sum([M_dynamics[i][j]*self._d[k,j] for j in range(self.sys.n_sys) if j != i], axis=0)
-                expr_m = expr - np.sum([m_dynamics[i][j]*self._d[k,j] for j in range(self.sys.n_sys) if j != i], axis=0)
-                for j in range(self.sys.n_x):
-                    self._model.addConstr(self._z[k,i,j] >= expr_M[j,0])
-                    self._model.addConstr(self._z[k,i,j] <= expr_m[j,0])
+                x_u_z_d = self._vector(self._x, k, self.sys.n_x) + self._vector(self._u, k, self.sys.n_u) + [self._z[k,i,j] for j in range(self.sys.n_x)] + self._vector(self._d, k, self.sys.n_sys)
+                add_linear_constraints(self._model, lhs, x_u_z_d, grb.GRB.LESS_EQUAL, np.vstack((-c, c)), tol=1.e-9)
         return
 
     def _terminal_constraint(self):
-        expr = self._linear_term(self.X_N.lhs_min, self._x, self.N) - clean_matrix(self.X_N.rhs_min)
-        self._model.addConstrs((expr[i,0] <= 0. for i in range(len(self.X_N.minimal_facets))))
+        x_N = self._vector(self._x, self.N, self.sys.n_x)
+        add_linear_constraints(self._model, self.X_N.lhs_min, x_N, grb.GRB.LESS_EQUAL, clean_matrix(self.X_N.rhs_min), tol=1.e-9)
         return
 
     def _MIP_parameters(self):
@@ -1,7 +1,7 @@
 import numpy as np
 import scipy.linalg as linalg
 import matplotlib.pyplot as plt
-from optimization.gurobi import linear_program
+from optimization.pnnls import linear_program_batch
 from geometry.polytope import Polytope
 from algebra import rangespace_basis, nullspace_basis
 import h5py
@@ -208,6 +208,46 @@ class PieceWiseAffineSystem(object):
                 return i
         return None
 
+    def find_domains(self, x, u):
+        """
+        Given the matrices x and u, whose columns are states and inputs, returns the 1D array of integers whose jth element is the i such that (x_j,u_j) \in D_i (-1 if (x_j,u_j) is not in any domain); each domain is checked for all the pairs with a single matrix product.
+        If (x_j,u_j) belongs to more than one domain, the first one is returned (as in find_domain()).
+        """
+        xu = np.vstack((x, u))
+        domains = np.full(xu.shape[1], -1, dtype=int)
+        for i in reversed(range(self.n_sys)):
+            domains[np.atleast_1d(self.domains[i].applies_to(xu))] = i
+        return domains
+
+    def random_state(self, check_sample_function=None, batch_size=100, sampling_polytope=None, batch_check=False):
+        """
+        Draws a random state in the box [x_min, x_max] or, if sampling_polytope is provided, in the polytope (with the hit-and-run random walk, see Polytope.sample()).
+        If check_sample_function is provided, the states are drawn in batches of batch_size states (matrices whose columns are states) and the first state accepted by check_sample_function is returned.
+        If batch_check is True, check_sample_function takes the whole batch and returns a 1D array of flags (e.g. Polytope.applies_to()), otherwise it takes a single state and returns a flag.
+        """
+        if check_sample_function is None:
+            batch_size = 1
+        while True:
+            if sampling_polytope is None:
+                x = np.random.rand(self.n_x, batch_size)
+                x = np.multiply(x, (self.x_max - self.x_min)) + self.x_min
+            else:
+                x = sampling_polytope.sample(batch_size)
+            if check_sample_function is None:
+                return x
+
+            # check the whole batch
+            if batch_check:
+                accepted = np.where(np.atleast_1d(check_sample_function(x)))[0]
+                if accepted.size > 0:
+                    return x[:, accepted[0]:accepted[0]+1]
+
+            # check the states one by one
+            else:
+                for i in range(batch_size):
+                    if check_sample_function(x[:, i:i+1]):
+                        return x[:, i:i+1]
+
     def save(self, group_name, super_group=None):
         """
         Saves the lists affine_systems anf domains in the group_name.hdf5 file.
@@ -265,7 +305,8 @@ class PieceWiseAffineSystem(object):
             A_i = linalg.block_diag(state_domains[i].lhs_min, input_domains[i].lhs_min)
             b_i = np.vstack((state_domains[i].rhs_min, input_domains[i].rhs_min))
             domain_i = Polytope(A_i, b_i)
-            domain_i.assemble()
+            # the product of two minimal representations is minimal
+            domain_i.assemble(known_facets=range(A_i.shape[0]))
             domains.append(domain_i)
         return PieceWiseAffineSystem(affine_systems, domains)
 
@@ -455,8 +496,8 @@ def moas(A, X, tol=1.e-9):
 
         # list of all minima
         J_sol = []
-        for i in range(n_constraints):
-            sol = linear_program(np.reshape(-J[i,:], (n_variables,1)), cons_lhs, cons_rhs)
+        sols = linear_program_batch(-J.T, cons_lhs, cons_rhs)
+        for i, sol in enumerate(sols):
             J_sol.append(-sol.min - X.rhs_min[i])
 
         # convergence check
@@ -0,0 +1,63 @@
+from __future__ import absolute_import, division, print_function
+import numpy as np
+from pympc.explicit_solution import upload_ExplicitSolution
+
+# runtime evaluation of explicit MPC laws: this module must import only numpy (no solvers, no plotting)
+
+
+class ExplicitController(object):
+    """
+    Evaluates an explicit MPC law exported with ModelPredictiveController.export_explicit_solution().
+
+    VARIABLES:
+        explicit_solution: ExplicitSolution (memory mapped by default)
+        n_u: number of inputs
+        N: number of inputs stored in the input sequence (1 if only the first input has been exported)
+    """
+
+    def __init__(self, directory_name, mmap_mode='r'):
+        self.explicit_solution = upload_ExplicitSolution(directory_name, mmap_mode)
+        self.n_u = self.explicit_solution.n_u
+        self.N = self.explicit_solution.u_offset.shape[1] // self.n_u
+        self._previous_region = -1
+        return
+
+    def _find_region(self, x):
+        """
+        Returns the index of the critical region of x (-1 if x is unfeasible), checking first the region found at the previous call.
+        """
+        s = self.explicit_solution
+        i = self._previous_region
+        if i >= 0:
+            rows = slice(s.offsets[i], s.offsets[i+1])
+            if np.max(s.A[rows,:].dot(x) - s.b[rows]) <= 1.e-6:
+                return i
+        i = s.lookup(x.reshape(1, -1))[0]
+        self._previous_region = i
+        return i
+
+    def feedforward(self, x):
+        """
+        Given the state of the system, returns the optimal sequence of N inputs and the related cost (nan if the state is unfeasible).
+        """
+        x = np.asarray(x, dtype=float).flatten()
+        i = self._find_region(x)
+        if i < 0:
+            return [np.full((self.n_u, 1), np.nan) for k in range(self.N)], np.nan
+        s = self.explicit_solution
+        u_sequence = s.u_linear[i].dot(x) + s.u_offset[i]
+        u_feedforward = [u_sequence[self.n_u*k:self.n_u*(k+1)].reshape(self.n_u, 1) for k in range(self.N)]
+        cost = .5*x.dot(s.V_quadratic[i]).dot(x) + s.V_linear[i].dot(x) + s.V_offset[i]
+        return u_feedforward, cost
+
+    def feedback(self, x):
+        """
+        Returns the a single input vector (the first of feedforward(x)).
+        """
+        x = np.asarray(x, dtype=float).flatten()
+        i = self._find_region(x)
+        if i < 0:
+            return np.full((self.n_u, 1), np.nan)
+        s = self.explicit_solution
+        u = s.u_linear[i,:self.n_u,:].dot(x) + s.u_offset[i,:self.n_u]
+        return u.reshape(self.n_u, 1)
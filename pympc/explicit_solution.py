@@ -0,0 +1,152 @@
+from __future__ import absolute_import, division, print_function
+import os
+import numpy as np
+
+
+class ExplicitSolution(object):
+    """
+    Explicit solution of a multiparametric QP (list of critical regions) stored in stacked arrays, so that the lookup and the evaluation of the control law for many parameters at once are a few matrix products.
+
+    VARIABLES:
+        A: halfspaces of all the critical regions stacked vertically (the ith region is {x | A[offsets[i]:offsets[i+1],:] x <= b[offsets[i]:offsets[i+1]]})
+        b: right-hand sides of all the critical regions stacked (1D array)
+        offsets: row offsets of the critical regions in A and b (n_regions + 1 integers)
+        u_linear: linear terms of the input sequences (n_regions x n_u*N x n_x)
+        u_offset: offset terms of the input sequences (n_regions x n_u*N)
+        V_quadratic: quadratic terms of the optimal value function (n_regions x n_x x n_x)
+        V_linear: linear terms of the optimal value function (n_regions x n_x)
+        V_offset: offset terms of the optimal value function (n_regions)
+        n_u: number of inputs (length of the first input in the input sequences, if None the whole sequence is considered as first input)
+    """
+
+    def __init__(self, A, b, offsets, u_linear, u_offset, V_quadratic, V_linear, V_offset, n_u):
+        self.A = A
+        self.b = b
+        self.offsets = offsets
+        self.u_linear = u_linear
+        self.u_offset = u_offset
+        self.V_quadratic = V_quadratic
+        self.V_linear = V_linear
+        self.V_offset = V_offset
+        if n_u is None:
+            n_u = u_offset.shape[1]
+        self.n_u = n_u
+        self.n_regions = offsets.shape[0] - 1
+        self.n_x = A.shape[1]
+        return
+
+    @staticmethod
+    def from_critical_regions(critical_regions, n_u=None):
+        """
+        Stacks the halfspaces, the gains and the value function terms of a list (or an NDPiecewise) of critical regions.
+
+        INPUTS:
+            critical_regions: list of CriticalRegion (see optimization.mpqpsolver)
+            n_u: number of inputs (optional)
+
+        OUTPUTS:
+            explicit_solution: ExplicitSolution
+        """
+        critical_regions = list(critical_regions)
+        A = np.vstack([cr.polytope.lhs_min for cr in critical_regions])
+        b = np.vstack([cr.polytope.rhs_min for cr in critical_regions]).flatten()
+        offsets = np.cumsum([0] + [cr.polytope.lhs_min.shape[0] for cr in critical_regions])
+        u_linear = np.array([cr.u_linear for cr in critical_regions])
+        u_offset = np.array([cr.u_offset.flatten() for cr in critical_regions])
+        V_quadratic = np.array([cr.V_quadratic for cr in critical_regions])
+        V_linear = np.array([cr.V_linear.flatten() for cr in critical_regions])
+        V_offset = np.array([np.asarray(cr.V_offset).flatten()[0] for cr in critical_regions])
+        return ExplicitSolution(A, b, offsets, u_linear, u_offset, V_quadratic, V_linear, V_offset, n_u)
+
+    def lookup(self, X, tol=1.e-6, chunk_size=10000):
+        """
+        Finds the critical region of each parameter (as NDPiecewise.lookup() the first region that contains the point is returned).
+
+        INPUTS:
+            X: parameters (n_points x n_x)
+            tol: tolerance for the inclusion of a point in a region
+            chunk_size: number of points processed with a single matrix product (bounds the memory used)
+
+        OUTPUTS:
+            indices: index of the critical region of each point (-1 if the point is not in the partition)
+        """
+        X = np.atleast_2d(X)
+        indices = np.full(X.shape[0], -1, dtype=int)
+        for start in range(0, X.shape[0], chunk_size):
+            X_chunk = X[start:start+chunk_size,:]
+            residuals = X_chunk.dot(self.A.T) - self.b
+            max_residuals = np.maximum.reduceat(residuals, self.offsets[:-1], axis=1)
+            is_inside = max_residuals <= tol
+            found = np.any(is_inside, axis=1)
+            indices[start:start+chunk_size][found] = np.argmax(is_inside[found,:], axis=1)
+        return indices
+
+    def evaluate(self, X, tol=1.e-6, chunk_size=10000):
+        """
+        Evaluates the explicit solution for many parameters at once.
+
+        INPUTS:
+            X: parameters (n_points x n_x)
+
+        OUTPUTS:
+            indices: index of the critical region of each point (-1 if the point is not in the partition)
+            u_first: first input for each point (n_points x n_u, nan if the point is not in the partition)
+            u_sequence: input sequence for each point (n_points x n_u*N, nan if the point is not in the partition)
+            cost: optimal value function for each point (n_points, nan if the point is not in the partition)
+        """
+        X = np.atleast_2d(X)
+        indices = self.lookup(X, tol, chunk_size)
+        found = indices >= 0
+        X_found = X[found,:]
+        i_found = indices[found]
+        u_sequence = np.full((X.shape[0], self.u_offset.shape[1]), np.nan)
+        u_sequence[found,:] = np.einsum('ijk,ik->ij', self.u_linear[i_found], X_found) + self.u_offset[i_found]
+        cost = np.full(X.shape[0], np.nan)
+        cost[found] = .5*np.einsum('ij,ijk,ik->i', X_found, self.V_quadratic[i_found], X_found) + np.einsum('ij,ij->i', self.V_linear[i_found], X_found) + self.V_offset[i_found]
+        return indices, u_sequence[:,:self.n_u], u_sequence, cost
+
+    def save(self, directory_name, full_sequence=True):
+        """
+        Writes the arrays of the explicit solution in the directory directory_name as .npy files, so that they can be memory mapped by upload_ExplicitSolution().
+        If full_sequence is False only the gains of the first input are stored.
+        """
+        if not os.path.isdir(directory_name):
+            os.makedirs(directory_name)
+        n_u_sequence = self.u_offset.shape[1] if full_sequence else self.n_u
+        arrays = {
+            'A': self.A,
+            'b': self.b,
+            'offsets': self.offsets,
+            'u_linear': self.u_linear[:,:n_u_sequence,:],
+            'u_offset': self.u_offset[:,:n_u_sequence],
+            'V_quadratic': self.V_quadratic,
+            'V_linear': self.V_linear,
+            'V_offset': self.V_offset,
+            'n_u': np.array([self.n_u])
+            }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory_name, name + '.npy'), np.ascontiguousarray(array))
+        return
+
+    def __len__(self):
+        return self.n_regions
+
+
+def upload_ExplicitSolution(directory_name, mmap_mode='r'):
+    """
+    Reads the directory directory_name (see ExplicitSolution.save()) and generates an ExplicitSolution from the data therein.
+    The arrays are memory mapped (mmap_mode is passed to numpy.load, None loads them in memory), hence the loading is instantaneous and processes that read the same files share the page cache.
+    """
+    def load(name):
+        return np.load(os.path.join(directory_name, name + '.npy'), mmap_mode=mmap_mode)
+    return ExplicitSolution(
+        load('A'),
+        load('b'),
+        load('offsets'),
+        load('u_linear'),
+        load('u_offset'),
+        load('V_quadratic'),
+        load('V_linear'),
+        load('V_offset'),
+        int(load('n_u')[0])
+        )
@@ -1,6 +1,6 @@
 import numpy as np
 from pympc.geometry.polytope import Polytope
-from pympc.optimization.pnnls import linear_program
+from pympc.optimization.backends import linear_program
 import matplotlib.pyplot as plt
 from scipy.spatial import ConvexHull
 from itertools import product
@@ -19,7 +19,13 @@ class Box:
         self.x_d_split = self.x_min[self.d_split, 0] + (self.x_max[self.d_split, 0] - self.x_min[self.d_split, 0])/2.
         
     def is_inside(self, x):
-        return np.min(x - self.x_min) > 0 and np.min(self.x_max - x) > 0
+        """
+        Determines if the point x is strictly inside the box; if x has more than one column, returns a 1D array of flags (one for each column).
+        """
+        is_inside = np.logical_and(np.min(x - self.x_min, axis=0) > 0, np.min(self.x_max - x, axis=0) > 0)
+        if is_inside.shape[0] == 1:
+            return is_inside[0]
+        return is_inside
     
     def which_side(self, x):
         if not self.is_inside(x):
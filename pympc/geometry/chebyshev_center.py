@@ -1,6 +1,6 @@
 import numpy as np
 from pympc.algebra import nullspace_basis
-from pympc.optimization.gurobi import linear_program
+from pympc.optimization.backends import linear_program
 
 def chebyshev_center(A, b, C=None, d=None, tol=1.e-10):
     """
@@ -32,9 +32,7 @@ def chebyshev_center(A, b, C=None, d=None, tol=1.e-10):
         b_projected = b - A.dot(Y.dot(y))
     [n_facets, n_variables] = A_projected.shape
     # check if the problem is trivially unbounded
-    A_row_norm = np.linalg.norm(A,axis=1)
-    A_zero_rows = np.where(A_row_norm < tol)[0]
-    if any(b[A_zero_rows] < 0.):
+    if trivially_empty(A, b, tol):
         radius = np.nan
         center = np.zeros((n_variables,1))
         center[:] = np.nan
@@ -58,4 +56,12 @@ def chebyshev_center(A, b, C=None, d=None, tol=1.e-10):
     if radius < tol:
         radius = np.nan
         center[:] = np.nan
-    return [center, radius]
\ No newline at end of file
+    return [center, radius]
+
+
+def trivially_empty(A, b, tol=1.e-10):
+    """
+    Returns True if one of the inequalities A x <= b has a zero left-hand side and a negative right-hand side (in this case chebyshev_center() returns without solving the LP).
+    """
+    A_zero_rows = np.where(np.linalg.norm(A, axis=1) < tol)[0]
+    return any(b[A_zero_rows] < 0.)
@@ -3,7 +3,7 @@ import numpy as np
 import scipy as sp
 from itertools import combinations
 from pympc.geometry.chebyshev_center import chebyshev_center
-from pympc.optimization.gurobi import linear_program
+from pympc.optimization.backends import linear_program
 import copy
 from scipy.spatial import ConvexHull as ScipyConvexHull
 
@@ -318,9 +318,14 @@ class PolytopeProjectionInnerApproximation:
     def applies_to(self, x, tol=1.e-9):
         """
         Determines if the given point belongs to the polytope (returns True or False).
+        If x has more than one column, returns a 1D array of flags (one for each column).
         """
         if self.hull is None:
-            return False
-        is_inside = np.max(self.hull.A.dot(x) - self.hull.b) <= tol # my version
+            if x.shape[1] == 1:
+                return False
+            return np.zeros(x.shape[1], dtype=bool)
+        is_inside = np.max(self.hull.A.dot(x) - self.hull.b, axis=0) <= tol # my version
         # is_inside = max((self.hull.equations[:,:-1].dot(x) + self.hull.equations[:,-1:]).flatten().tolist()) <= tol # qhull version
+        if is_inside.shape[0] == 1:
+            return is_inside[0]
         return is_inside
\ No newline at end of file
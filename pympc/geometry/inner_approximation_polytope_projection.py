@@ -1,5 +1,6 @@
 import numpy as np
-from pympc.optimization.gurobi import linear_program, quadratically_constrained_linear_program
+from pympc.optimization.backends import linear_program
+from pympc.optimization.gurobi import quadratically_constrained_linear_program
 from scipy.spatial import ConvexHull
 import scipy.linalg as linalg
 import h5py
@@ -1,19 +1,24 @@
 import numpy as np
+import time
 import matplotlib.pyplot as plt
 from pyhull.halfspace import Halfspace, HalfspaceIntersection
 import cdd
-from pympc.optimization.pnnls import linear_program
-from pympc.geometry.chebyshev_center import chebyshev_center
+from pympc.optimization.pnnls import linear_program_batch
+from pympc.optimization.backends import linear_program
+from pympc.geometry.chebyshev_center import chebyshev_center, trivially_empty
 from pympc.geometry.convex_hull import orthogonal_projection_CHM
 from pympc.algebra import rangespace_basis, nullspace_basis
 import scipy.spatial as spatial
 from matplotlib.path import Path
 import matplotlib.patches as patches
+import h5py
+import ast
 
 
-class Polytope:
+class Polytope(object):
     """
     Defines a polytope as {x | A * x <= b}.
+    The derived properties of the polytope (empty, bounded, center, radius, coincident_facets, minimal_facets, lhs_min, rhs_min) are computed at the first access and then cached, hence the assembly of a polytope costs nothing until the expensive data are needed (the checks required in assemble() are computed immediately).
 
     VARIABLES:
         A: left-hand side of redundant description of the polytope {x | A * x <= b}
@@ -22,16 +27,18 @@ class Polytope:
         n_variables: dimension of the variable x
         assembled: flag that determines when it isn't possible to add constraints
         empty: True if the polytope is empty, False otherwise
-        bounded: True if the polytope is bounded, False otherwise (if False a ValueError is thrown)
+        bounded: True if the polytope is bounded, False otherwise (if False a ValueError is thrown by assemble() when check_boundedness is True)
         center: Chebyshev center of the polytope
         radius: Chebyshev radius of the polytope
         coincident_facets: list of of lists of coincident facets (one list for each facet)
         minimal_facets: list of indices of the non-redundant facets
-        A_min: left-hand side of non-redundant facets
-        b_min: right-hand side of non-redundant facets
-        facet_centers: list of Chebyshev centers of each non-redundant facet (i.e.: A_min[i,:].dot(facet_centers[i]) = b_min[i])
+        lhs_min: left-hand side of non-redundant facets
+        rhs_min: right-hand side of non-redundant facets
+        facet_centers: list of Chebyshev centers of each non-redundant facet (i.e.: lhs_min[i,:].dot(facet_centers[i]) = rhs_min[i])
         facet_radii: list of Chebyshev radii of each non-redundant facet
         vertices: list of vertices of the polytope (each one is a 1D array)
+        assembly_times: dictionary with the time spent in each step of the assembly (emptiness, boundedness, coincidences, redundancy)
+        n_chebyshev_lps, n_boundedness_lps, n_facet_lps, n_redundancy_lps: number of LPs solved for the Chebyshev center, the boundedness check, the Chebyshev centers of the facets and the redundancy removal
     """
 
     def __init__(self, A, b):
@@ -88,41 +95,138 @@ class Polytope:
         self,
         check_emptiness=True,
         check_boundedness=True,
-        check_coincidences=True,
-        check_redundancy=True,
-        vertices=None
+        check_coincidences=False,
+        check_redundancy=False,
+        vertices=None,
+        known_facets=None,
+        screening=False,
+        redundancy_method='lp'
         ):
+        """
+        Prepares the polytope for the computation of its properties (see the list of the variables of the class).
+        The checks whose flag is True are performed immediately (an unbounded polyhedron raises a ValueError), the other properties are computed at their first access.
+        known_facets, screening and redundancy_method (as method) are passed to find_minimal_facets().
+        """
         if self.assembled:
             raise ValueError('Polytope already assembled, cannot assemble again!')
         self.assembled = True
         [self.n_facets, self.n_variables] = self.A.shape
         self.normalize()
-        self.empty = None
-        if check_emptiness:
-            self.check_emptiness()
-            if self.empty:
-                return self
-        self.bounded = None
-        if check_boundedness:
-            self.check_boundedness()
-            if not(self.bounded):
-                raise ValueError('Unbounded polyhedron: only polytopes allowed')
-        self.coincident_facets = None
-        if check_coincidences:
-            self.find_coincident_facets()
-        if check_redundancy:
-            self.find_minimal_facets()
-        else:
-            self.minimal_facets = range(self.n_facets)
-            self.lhs_min = self.A
-            self.rhs_min = self.b
+        self.assembly_times = dict()
+        self._empty = None
+        self._center = None
+        self._radius = None
+        self._bounded = None
+        self._coincident_facets = None
+        self._minimal_facets = None
+        self._lhs_min = None
+        self._rhs_min = None
+        self._known_facets = known_facets
+        self._screening = screening
+        self._redundancy_method = redundancy_method
         self._vertices = vertices
-        self._facet_centers = [None] * len(self.minimal_facets)
-        self._facet_radii = [None] * len(self.minimal_facets)
+        self._facet_centers = None
+        self._facet_radii = None
         self._x_min = None
         self._x_max = None
+        self.n_chebyshev_lps = 0
+        self.n_boundedness_lps = 0
+        self.n_facet_lps = 0
+        if check_emptiness and self.empty:
+            return self
+        if check_boundedness and not self.bounded:
+            raise ValueError('Unbounded polyhedron: only polytopes allowed')
+        if check_coincidences:
+            self._timed('coincidences', self.find_coincident_facets)
+        if check_redundancy:
+            self._timed('redundancy', self.find_minimal_facets, known_facets=known_facets, screening=screening, method=redundancy_method)
         return self
 
+    def _timed(self, step, function, *args, **kwargs):
+        """
+        Calls the given function storing its execution time in assembly_times[step].
+        """
+        tic = time.time()
+        function(*args, **kwargs)
+        self.assembly_times[step] = time.time() - tic
+        return
+
+    @property
+    def empty(self):
+        if self._empty is None:
+            self._timed('emptiness', self.check_emptiness)
+        return self._empty
+
+    @empty.setter
+    def empty(self, empty):
+        self._empty = empty
+
+    @property
+    def center(self):
+        if self._empty is None:
+            self._timed('emptiness', self.check_emptiness)
+        return self._center
+
+    @center.setter
+    def center(self, center):
+        self._center = center
+
+    @property
+    def radius(self):
+        if self._empty is None:
+            self._timed('emptiness', self.check_emptiness)
+        return self._radius
+
+    @radius.setter
+    def radius(self, radius):
+        self._radius = radius
+
+    @property
+    def bounded(self):
+        if self._bounded is None:
+            self._timed('boundedness', self.check_boundedness)
+        return self._bounded
+
+    @bounded.setter
+    def bounded(self, bounded):
+        self._bounded = bounded
+
+    @property
+    def coincident_facets(self):
+        if self._coincident_facets is None:
+            self._timed('coincidences', self.find_coincident_facets)
+        return self._coincident_facets
+
+    @coincident_facets.setter
+    def coincident_facets(self, coincident_facets):
+        self._coincident_facets = coincident_facets
+
+    @property
+    def minimal_facets(self):
+        if self._minimal_facets is None:
+            self._timed('redundancy', self.find_minimal_facets, known_facets=self._known_facets, screening=self._screening, method=self._redundancy_method)
+        return self._minimal_facets
+
+    @minimal_facets.setter
+    def minimal_facets(self, minimal_facets):
+        self._minimal_facets = minimal_facets
+        self._lhs_min = None
+        self._rhs_min = None
+        self._facet_centers = None
+        self._facet_radii = None
+
+    @property
+    def lhs_min(self):
+        if self._lhs_min is None:
+            self._lhs_min = self.A[self.minimal_facets,:]
+        return self._lhs_min
+
+    @property
+    def rhs_min(self):
+        if self._rhs_min is None:
+            self._rhs_min = self.b[self.minimal_facets]
+        return self._rhs_min
+
     def normalize(self, tol=1e-9):
         """
         Normalizes the H-polytope dividing each row of A by its norm and each entry of b by the norm of the corresponding row of A.
@@ -139,7 +243,7 @@ class Polytope:
         Checks if the polytope is empty finding its Chebychev center and radius.
         """
         self.empty = False
-        self.center, self.radius = chebyshev_center(self.A, self.b)
+        self.center, self.radius = self._chebyshev_center(self.A, self.b)
         if np.isnan(self.radius):
             self.empty = True
             print('Empty polytope!')
@@ -149,9 +253,9 @@ class Polytope:
         """
         Checks if the polyhedron is bounded: a polyhedron is unbounded (i.e. a polytope) iff there exists an x != 0 in the recession cone (A*x <= 0). We also have that { exists x != 0 | A*x <= 0 } <=> { exists z < 0 | A^T*z = 0 }. The second condition is tested through a LP.
         """
-        if self.bounded is not None:
+        if self._radius is not None:
             # if the Chebyshev radius is infinite
-            if np.isinf(self.radius):
+            if np.isinf(self._radius):
                 print('Infinite Chebyshev center or radius!')
                 self.bounded = False
                 return
@@ -169,6 +273,7 @@ class Polytope:
         C = self.A.T
         d = np.zeros((self.A.shape[1],1))
         sol = linear_program(f, A, b, C, d)
+        self.n_boundedness_lps += 1
         if any(np.isnan(sol.argmin)):
             self.bounded = False
             print 'Boundedness test failed!'
@@ -177,24 +282,49 @@ class Polytope:
     def find_coincident_facets(self, rel_tol=1e-9, abs_tol=1e-9):
         """
         For each facet of the (potentially redundant) polytope finds the set of coincident facets and stores a list whose ith entry is the list of the facetes coincident with the ith facets (the index i itself is included in this list; e.g., if the ith and the jth facets are coincident coincident_facets[i] = coincident_facets[j] = [i,j]).
+        The rows of [A b] are sorted by their projection on a fixed random direction: the projections of two coincident facets differ at most by the (projected) tolerances, hence each facet is compared only with the facets in a window of the sorted list, instead of with the whole matrix.
         """
+        Ab = np.hstack((self.A, self.b))
+        direction = np.random.RandomState(0).rand(Ab.shape[1])
+        projections = Ab.dot(direction)
+        order = np.argsort(projections)
+        sorted_projections = projections[order]
+        # bound on the distance between the projections of coincident facets (doubled to cover rounding errors)
+        widths = 2.*(abs_tol + rel_tol*np.abs(Ab)).dot(direction)
+        window_start = np.searchsorted(sorted_projections, projections - widths, side='left')
+        window_end = np.searchsorted(sorted_projections, projections + widths, side='right')
         # coincident facets indices
         self.coincident_facets = []
-        Ab = np.hstack((self.A, self.b))
         for i in range(0, self.n_facets):
-            coincident_flag_matrix = np.isclose(Ab, Ab[i,:], rel_tol, abs_tol)
+            window = order[window_start[i]:window_end[i]]
+            coincident_flag_matrix = np.isclose(Ab[window,:], Ab[i,:], rel_tol, abs_tol)
             coincident_flag_vector = np.all(coincident_flag_matrix, axis=1)
-            coincident_facets_i = sorted(np.where(coincident_flag_vector)[0].tolist())
+            coincident_facets_i = sorted(window[coincident_flag_vector].tolist())
             self.coincident_facets.append(coincident_facets_i)
         return
 
-    def find_minimal_facets(self, tol=1e-9):
+    def find_minimal_facets(self, tol=1e-9, known_facets=None, screening=False, method='lp'):
         """
-        Finds the non-redundant facets and derives a minimal representation of the polyhedron solving a LP for each facet. See "Fukuda - Frequently asked questions in polyhedral computation" Sec.2.21.
+        Finds the non-redundant facets and derives a minimal representation of the polyhedron.
+        With method 'lp' a LP is solved for each facet (see "Fukuda - Frequently asked questions in polyhedral computation" Sec.2.21), with method 'clarkson' the output-sensitive algorithm of Clarkson is used (see _clarkson()); the latter requires a full-dimensional polytope, otherwise the method 'lp' is used.
+        The facets in known_facets are known to be non-redundant and no LP is solved for them.
+        If screening is True, before solving the LPs, the rows with zero norm are removed and a bounding box of the polytope is computed (2*n_variables LPs): the facets that do not touch the box are redundant.
+        The number of LPs solved is stored in n_redundancy_lps.
         """
+        if method not in ['lp', 'clarkson']:
+            raise ValueError('Unknown method ' + str(method) + ' for the redundancy removal.')
         # list of non-redundant facets
         self.minimal_facets = range(self.n_facets)
-        for i in range(self.n_facets):
+        self.n_redundancy_lps = 0
+        if known_facets is None:
+            known_facets = []
+        candidates = [i for i in range(self.n_facets) if i not in known_facets]
+        if screening:
+            candidates = self._screen_facets(candidates)
+        if method == 'clarkson' and not self.empty and self.radius > tol:
+            self._clarkson(candidates, tol)
+            return
+        for i in candidates:
             # remove redundant constraints
             A_reduced = self.A[self.minimal_facets,:]
             # relax the ith constraint
@@ -203,33 +333,107 @@ class Polytope:
             b_relaxed = (self.b + b_relaxation)[self.minimal_facets];
             # check redundancy
             sol = linear_program(-self.A[i,:], A_reduced, b_relaxed)
+            self.n_redundancy_lps += 1
             cost_i = - sol.min
             # remove redundant facets from the list
             if cost_i - self.b[i] < tol or np.isnan(cost_i):
                 self.minimal_facets.remove(i)
-        # list of non redundant facets
-        self.lhs_min = self.A[self.minimal_facets,:]
-        self.rhs_min = self.b[self.minimal_facets]
         return
 
+    def _clarkson(self, candidates, tol):
+        """
+        Clarkson's algorithm (see "Clarkson - More output-sensitive geometric algorithms"): each candidate facet is relaxed and checked with a LP which contains only the facets already known to be non-redundant. If the solution of the LP violates the candidate, the first facet hit by the ray from the Chebyshev center to the solution is non-redundant: it is added to the known facets and the candidate is checked again.
+        The number of LPs is at most the number of candidates plus the number of non-redundant facets, and their size is bounded by the number of non-redundant facets.
+        """
+        non_redundant = [i for i in self.minimal_facets if i not in candidates]
+        candidates = list(candidates)
+        while candidates:
+            i = candidates[0]
+            # relax the ith constraint
+            rows = non_redundant + [i]
+            b_relaxed = self.b[rows]
+            b_relaxed[-1] += 1.
+            # check redundancy with respect to the non-redundant facets found so far
+            sol = linear_program(-self.A[i,:], self.A[rows,:], b_relaxed)
+            self.n_redundancy_lps += 1
+            cost_i = - sol.min
+            if cost_i - self.b[i,0] < tol or np.isnan(cost_i):
+                candidates.pop(0)
+                continue
+            # ray shooting (in case of ties the last facet is taken, as the method 'lp' does with coincident facets)
+            direction = sol.argmin - self.center
+            residuals = (self.b[candidates,:] - self.A[candidates,:].dot(self.center)).flatten()
+            slopes = self.A[candidates,:].dot(direction).flatten()
+            steps = np.full(len(candidates), np.inf)
+            hit = np.where(slopes > tol)[0]
+            steps[hit] = residuals[hit]/slopes[hit]
+            ties = np.where(steps <= np.min(steps) + tol)[0]
+            non_redundant.append(candidates.pop(ties[-1]))
+        self.minimal_facets = sorted(non_redundant)
+        return
+
+    def _screen_facets(self, candidates, tol=1.e-6):
+        """
+        Removes from minimal_facets the rows with zero norm and the facets that are strictly inside the bounding box of the polytope; returns the candidates that still require the LP.
+        """
+
+        # rows with zero norm (0 <= b, since the polytope is not empty)
+        for i in candidates:
+            if np.linalg.norm(self.A[i,:]) < tol:
+                self.minimal_facets.remove(i)
+        candidates = [i for i in candidates if i in self.minimal_facets]
+
+        # bounding box (only if it's cheaper than the LPs it could save)
+        if 2*self.n_variables >= len(candidates):
+            return candidates
+        I = np.eye(self.n_variables)
+        sols = linear_program_batch(np.hstack((I, -I)), self.A[self.minimal_facets,:], self.b[self.minimal_facets])
+        x_min = np.array([[sol.min] for sol in sols[:self.n_variables]])
+        x_max = np.array([[-sol.min] for sol in sols[self.n_variables:]])
+        self.n_redundancy_lps += 2*self.n_variables
+        if any(np.isnan(x_min)) or any(np.isnan(x_max)):
+            return candidates
+
+        # a facet that does not touch the box does not touch the polytope
+        for i in candidates:
+            a = self.A[i:i+1,:]
+            box_max = np.maximum(a, 0.).dot(x_max) + np.minimum(a, 0.).dot(x_min)
+            if box_max[0,0] < self.b[i,0] - tol:
+                self.minimal_facets.remove(i)
+        return [i for i in candidates if i in self.minimal_facets]
+
     def facet_centers(self, i):
-        if self._facet_centers[i] is None:
-            A_lp = np.delete(self.lhs_min, i, 0)
-            b_lp = np.delete(self.rhs_min, i, 0)
-            C_lp = np.reshape(self.lhs_min[i,:], (1, self.n_variables))
-            d_lp = self.rhs_min[i,:]
-            self._facet_centers[i], self._facet_radii[i] = chebyshev_center(A_lp, b_lp, C_lp, d_lp)
+        if self._facet_centers is None or self._facet_centers[i] is None:
+            self._facet_chebyshev_center(i)
         return self._facet_centers[i]
 
     def facet_radii(self, i):
-        if self._facet_radii[i] is None:
-            A_lp = np.delete(self.lhs_min, i, 0)
-            b_lp = np.delete(self.rhs_min, i, 0)
-            C_lp = np.reshape(self.lhs_min[i,:], (1, self.n_variables))
-            d_lp = self.rhs_min[i,:]
-            self._facet_centers[i], self._facet_radii[i] = chebyshev_center(A_lp, b_lp, C_lp, d_lp)
+        if self._facet_radii is None or self._facet_radii[i] is None:
+            self._facet_chebyshev_center(i)
         return self._facet_radii[i]
 
+    def _facet_chebyshev_center(self, i):
+        """
+        Stores the Chebyshev center and radius of the ith minimal facet (the LPs solved are counted in n_facet_lps).
+        """
+        if self._facet_centers is None:
+            self._facet_centers = [None] * len(self.minimal_facets)
+            self._facet_radii = [None] * len(self.minimal_facets)
+        A_lp = np.delete(self.lhs_min, i, 0)
+        b_lp = np.delete(self.rhs_min, i, 0)
+        C_lp = np.reshape(self.lhs_min[i,:], (1, self.n_variables))
+        d_lp = self.rhs_min[i,:]
+        self._facet_centers[i], self._facet_radii[i] = self._chebyshev_center(A_lp, b_lp, C_lp, d_lp, 'n_facet_lps')
+        return
+
+    def _chebyshev_center(self, A, b, C=None, d=None, counter='n_chebyshev_lps'):
+        """
+        Calls chebyshev_center() and increments the given counter of LPs if the LP is actually solved.
+        """
+        if not trivially_empty(A, b):
+            setattr(self, counter, getattr(self, counter) + 1)
+        return chebyshev_center(A, b, C, d)
+
     @property
     def vertices(self):
         """
@@ -259,7 +463,7 @@ class Polytope:
         if method == 'convex_hull':
             A_proj, b_proj, v_proj = orthogonal_projection_CHM(self.lhs_min, self.rhs_min, residual_variables)
             p_proj = Polytope(A_proj, b_proj)
-            p_proj.assemble(check_redundancy=False, vertices=v_proj)
+            p_proj.assemble(vertices=v_proj, known_facets=range(A_proj.shape[0]))
 
         # elif method == 'block_elimination':
         #     drop_variables = [i+1 for i in range(self.n_variables) if i not in residual_variables]
@@ -305,45 +509,132 @@ class Polytope:
         Checks if the polytope is a subset of the polytope p (returns True or False).
         """
         inclusion = True
-        for i in range(p.lhs_min.shape[0]):
-            sol = linear_program(-p.lhs_min[i,:], self.lhs_min, self.rhs_min)
+        sols = linear_program_batch(-p.lhs_min.T, self.lhs_min, self.rhs_min)
+        for i, sol in enumerate(sols):
             penetration = - sol.min - p.rhs_min[i]
             if penetration > tol:
                 inclusion = False
                 break
         return inclusion
 
+    def union_if_convex(self, p, tol=1.e-6):
+        """
+        Returns the union of the polytope with the polytope p if the union is convex, None otherwise. The envelope of the two polytopes (facets of each polytope that are valid for the other one) contains their union, and it is equal to it iff the union is convex (see "Bemporad et al. - Convexity recognition of the union of polyhedra").
+        """
+        # facets of each polytope that are valid for the other one
+        kept = []
+        removed = []
+        for p_1, p_2 in [(self, p), (p, self)]:
+            sols = linear_program_batch(-p_1.lhs_min.T, p_2.lhs_min, p_2.rhs_min)
+            for i, sol in enumerate(sols):
+                if - sol.min - p_1.rhs_min[i,0] < tol:
+                    kept.append(np.hstack((p_1.lhs_min[i,:], p_1.rhs_min[i,:])))
+                elif p_1 is self:
+                    removed.append(np.hstack((p_1.lhs_min[i,:], p_1.rhs_min[i,:])))
+        if not kept:
+            return None
+        env = np.vstack(kept)
+
+        # the envelope minus self must be included in p
+        for facet in removed:
+            A = np.vstack((env[:,:-1], -facet[:-1]))
+            b = np.vstack((env[:,-1:], -facet[-1:]))
+            sols = linear_program_batch(-p.lhs_min.T, A, b)
+            for i, sol in enumerate(sols):
+                if - sol.min - p.rhs_min[i,0] > tol:
+                    return None
+
+        # assemble the union
+        union = Polytope(env[:,:-1], env[:,-1:])
+        union.assemble()
+        return union
+
     def applies_to(self, x, tol=1.e-6):
         """
         Determines if the given point belongs to the polytope (returns True or False).
+        If x is a matrix with more than one column, each column is a point and a 1D array of flags is returned (computed with a single matrix product).
+        If the non-redundant facets have not been computed yet, the redundant representation is used (no LP is solved).
         """
-        is_inside = np.max(self.lhs_min.dot(x) - self.rhs_min) <= tol
+        if self._minimal_facets is None:
+            is_inside = np.max(self.A.dot(x) - self.b, axis=0) <= tol
+        else:
+            is_inside = np.max(self.lhs_min.dot(x) - self.rhs_min, axis=0) <= tol
+        if is_inside.shape[0] == 1:
+            return is_inside[0]
         return is_inside
 
     @property
     def x_min(self):
         if self._x_min is None:
-            self._x_min = []
-            for i in range(self.n_variables):
-                f = np.zeros((self.n_variables, 1))
-                f[i,:] += 1.
-                sol = linear_program(f, self.lhs_min, self.rhs_min)
-                self._x_min.append([sol.min])
-            self._x_min = np.array(self._x_min)
+            self._bounding_box()
         return self._x_min
 
     @property
     def x_max(self):
         if self._x_max is None:
-            self._x_max = []
-            for i in range(self.n_variables):
-                f = np.zeros((self.n_variables, 1))
-                f[i,:] += 1.
-                sol = linear_program(-f, self.lhs_min, self.rhs_min)
-                self._x_max.append([-sol.min])
-            self._x_max = np.array(self._x_max)
+            self._bounding_box()
         return self._x_max
 
+    def _bounding_box(self):
+        """
+        Computes x_min and x_max with a single batch of LPs.
+        """
+        I = np.eye(self.n_variables)
+        sols = linear_program_batch(np.hstack((I, -I)), self.lhs_min, self.rhs_min)
+        self._x_min = np.array([[sol.min] for sol in sols[:self.n_variables]])
+        self._x_max = np.array([[-sol.min] for sol in sols[self.n_variables:]])
+        return
+
+    def sample(self, n_samples, n_chains=10, burn_in=100, thinning=10, x0=None, tol=1.e-9):
+        """
+        Draws approximately uniform samples in the polytope with the hit-and-run random walk: at each step every point moves to a uniformly distributed point of the chord of the polytope through it along a random direction.
+        The chains are run in parallel (the chords of all the chains are computed with a single matrix product) and, after the burn in, the points of one step every thinning steps are collected.
+        If the non-redundant facets have not been computed yet, the redundant representation is used (no LP is solved).
+
+        INPUTS:
+            n_samples: number of samples
+            n_chains: number of chains of the random walk
+            burn_in: number of steps discarded at the beginning of the walk
+            thinning: number of steps between two collections of samples
+            x0: starting point of the chains (the Chebyshev center of the polytope if not provided)
+
+        OUTPUTS:
+            samples: matrix whose columns are the samples
+        """
+        if self._minimal_facets is None:
+            A, b = self.A, self.b
+        else:
+            A, b = self.lhs_min, self.rhs_min
+        if x0 is None:
+            if self.empty:
+                raise ValueError('Cannot sample an empty polytope!')
+            x0 = self.center
+        x = np.repeat(x0, n_chains, axis=1)
+        samples = []
+        n_steps = 0
+        while sum(s.shape[1] for s in samples) < n_samples:
+
+            # random directions
+            directions = np.random.randn(self.n_variables, n_chains)
+            directions /= np.linalg.norm(directions, axis=0)
+
+            # chords through the current points
+            slopes = A.dot(directions)
+            steps = (b - A.dot(x))/np.where(np.abs(slopes) > tol, slopes, 1.)
+            t_max = np.min(np.where(slopes > tol, steps, np.inf), axis=0)
+            t_min = np.max(np.where(slopes < -tol, steps, -np.inf), axis=0)
+            if np.any(np.isinf(t_max)) or np.any(np.isinf(t_min)):
+                raise ValueError('Unbounded polyhedron: only polytopes allowed')
+
+            # uniform point on the chords
+            t = t_min + np.random.rand(n_chains)*(t_max - t_min)
+            x = x + directions*t
+            n_steps += 1
+            if n_steps > burn_in and (n_steps - burn_in) % thinning == 0:
+                samples.append(x)
+
+        return np.hstack(samples)[:,:n_samples]
+
     def plot(self, dim_proj=[0,1], largest_ball=False, **kwargs):
         """
         Plots a 2d projection of the polytope.
@@ -392,6 +683,63 @@ class Polytope:
         p = Polytope(A, b)
         return p
 
+    def save(self, group_name, super_group=None):
+        """
+        Saves the (assembled) polytope in the group_name.hdf5 file, together with the results of the assembly (emptiness, Chebyshev center, coincident and minimal facets), so that it can be uploaded without solving any LP.
+        If a super group is provided, instead of saving the file, it adds the sub group gorup_name to the super group.
+        """
+
+        # open the file
+        if super_group is None:
+            group = h5py.File(group_name + '.hdf5', 'w')
+        else:
+            group = super_group.create_group(group_name)
+
+        # write the halfspaces and the results of the assembly
+        group.create_dataset('A', data=self.A)
+        group.create_dataset('b', data=self.b)
+        group.create_dataset('empty', data=np.array([bool(self.empty)]))
+        if not self.empty:
+            group.create_dataset('center', data=self.center)
+            group.create_dataset('radius', data=np.array([self.radius]))
+            group.create_dataset('minimal_facets', data=np.string_(str(list(self.minimal_facets))))
+            group.create_dataset('coincident_facets', data=np.string_(str(self.coincident_facets)))
+
+        # close the file and return
+        if super_group is None:
+            group.close()
+            return
+        else:
+            return super_group
+
+def upload_Polytope(group_name, super_group=None):
+    """
+    Reads the file group_name.hdf5 and generates an assembled polytope from the data therein (see Polytope.save()).
+    If a super_group is provided, reads the sub group named group_name which belongs to the super_group.
+    """
+
+    # open the file
+    if super_group is None:
+        polytope = h5py.File(group_name + '.hdf5', 'r')
+    else:
+        polytope = super_group[group_name]
+
+    # read the halfspaces and restore the results of the assembly
+    p = Polytope(np.array(polytope['A']), np.array(polytope['b']))
+    p.assemble(check_emptiness=False, check_boundedness=False, check_coincidences=False, check_redundancy=False)
+    p.empty = bool(polytope['empty'][0])
+    if not p.empty:
+        p.bounded = True
+        p.center = np.array(polytope['center'])
+        p.radius = float(polytope['radius'][0])
+        p.minimal_facets = ast.literal_eval(str(polytope['minimal_facets'][()]))
+        p.coincident_facets = ast.literal_eval(str(polytope['coincident_facets'][()]))
+
+    # close the file and return
+    if super_group is None:
+        polytope.close()
+    return p
+
 class LowerDimensionalPolytope:
 
     def __init__(self, A, b, C, d):
@@ -255,27 +255,34 @@ class BoxAtlasPWAModel(object):
         # hybrid controller
         return MPCHybridController(self.pwa_system, N, objective_norm, Q, R, P, X_N)
 
-    def random_state(self, X=None, controller=None):
+    def random_state(self, X=None, controller=None, batch_size=100):
         """
         Sample a random state within the lower and upper bounds of the piecewise
         affine system, and further restrict that state to some polytope X. By
         default, X is the polytope defined by the robot's kinematic limits.
 
         If `controller` is not None, use the given controller to check if there
-        is a feasible input sequence from the given sample before returning it
+        is a feasible input sequence from the given sample before returning it.
+
+        The states are drawn in batches of `batch_size` samples directly
+        inside the intersection of X with the bounds, with the hit-and-run
+        random walk (see Polytope.sample()).
         """
         if X is None:
             A = self.kinematic_limits.polytope.A
             b = self.kinematic_limits.polytope.b
             x_eq, u_eq = self.equilibrium_point()
             X = Polytope(A, b - A.dot(x_eq)).assemble()
+        X_bounded = Polytope(X.A, X.b)
+        X_bounded.add_bounds(self.pwa_system.x_min, self.pwa_system.x_max)
+        X_bounded.assemble()
 
         while True:
-            x = np.random.rand(self.pwa_system.n_x, 1)
-            x = np.multiply(x, (self.pwa_system.x_max - self.pwa_system.x_min)) + self.pwa_system.x_min
-            if X.applies_to(x):
+            x = X_bounded.sample(batch_size)
+            for i in range(x.shape[1]):
+                x_i = x[:, i:i+1]
                 if controller is not None:
-                    u, xtraj, ss, cost = controller.feedforward(x)
+                    u, xtraj, ss, cost = controller.feedforward(x_i)
                     if np.any(np.isnan(u[0])):
                         continue
-                return x
+                return x_i
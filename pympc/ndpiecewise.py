@@ -1,4 +1,5 @@
 from __future__ import absolute_import, division, print_function
+import numpy as np
 
 
 class Polyhedron(object):
@@ -22,18 +23,150 @@ class Element(object):
         return self.polyhedron.contains(point)
 
 
+class SearchTreeNode(object):
+    """
+    Node of the binary search tree of an NDPiecewise. Internal nodes store a hyperplane normal' x = offset and two children (the first for normal' x <= offset, the second for normal' x > offset); leaves store the list of elements that still have to be checked.
+    """
+    __slots__ = ["normal", "offset", "children", "elements"]
+    def __init__(self, normal=None, offset=None, children=None, elements=None):
+        self.normal = normal
+        self.offset = offset
+        self.children = children
+        self.elements = elements
+
+    @property
+    def depth(self):
+        if self.elements is not None:
+            return 0
+        return 1 + max(child.depth for child in self.children)
+
+
 class NDPiecewise(object):
-    def __init__(self, elements):
+    """
+    Piecewise-defined function over a list of elements (e.g. the critical regions of an explicit MPC law).
+
+    VARIABLES:
+        elements: list of elements (each one exposes applies_to(point))
+        neighbors: optional adjacency graph, neighbors[i][j] is the list of indices of the elements that can be found crossing the jth facet of the ith element
+        search_tree: optional binary search tree (see build_search_tree())
+    """
+    def __init__(self, elements, neighbors=None):
         self.elements = elements
+        self.neighbors = neighbors
+        self.search_tree = None
+        self._indices = dict((id(element), i) for i, element in enumerate(elements))
 
-    def lookup(self, point):
+    def lookup(self, point, start=None):
+        """
+        Returns the element that contains the point (None if there is no such element).
+        If start is an element and the adjacency graph is available, the search begins from start and walks across the violated facets; if the walk gets stuck it falls back on the search tree or on the linear scan.
+        """
+        if start is not None and self.neighbors is not None:
+            element = self._walk_lookup(point, start)
+            if element is not None:
+                return element
+        if self.search_tree is not None:
+            return self._tree_lookup(point)
         for element in self.elements:
             if element.applies_to(point):
                 return element
         return None
 
+    def _walk_lookup(self, point, start, tol=1.e-6):
+        i = self._indices[id(start)]
+        visited = set()
+        while i not in visited:
+            visited.add(i)
+            polytope = _element_polytope(self.elements[i])
+            residuals = (polytope.lhs_min.dot(point) - polytope.rhs_min).flatten()
+            facet = np.argmax(residuals)
+            if residuals[facet] <= tol:
+                return self.elements[i]
+            candidates = [j for j in self.neighbors[i][facet] if j not in visited]
+            if not candidates:
+                return None
+            i = candidates[0]
+        return None
+
+    def _tree_lookup(self, point):
+        node = self.search_tree
+        while node.elements is None:
+            if float(np.dot(node.normal, point)) <= node.offset:
+                node = node.children[0]
+            else:
+                node = node.children[1]
+        for element in node.elements:
+            if element.applies_to(point):
+                return element
+        return None
+
+    def build_search_tree(self, tol=1.e-7, decimals=8):
+        """
+        Builds a binary search tree over the hyperplanes of the elements (Tondel et al. - Evaluation of piecewise affine control via binary search tree). Each element is placed on the side(s) of a hyperplane where it has at least one vertex strictly beyond the tolerance tol, so after the tree is built lookup() needs O(depth) hyperplane evaluations plus the containment checks of the elements stored in the reached leaf.
+        """
+
+        # collect the hyperplanes of the elements (duplicates and opposite orientations are merged)
+        polytopes = [_element_polytope(element) for element in self.elements]
+        hyperplanes = dict()
+        for p in polytopes:
+            for a, b in zip(p.lhs_min, p.rhs_min.flatten()):
+                a, b = a/np.linalg.norm(a), b/np.linalg.norm(a)
+                if a[np.nonzero(np.round(a, decimals))[0][0]] < 0.:
+                    a, b = -a, -b
+                key = tuple(np.round(np.hstack((a, b)), decimals))
+                hyperplanes.setdefault(key, (a, b))
+        normals = np.array([h[0] for h in hyperplanes.values()])
+        offsets = np.array([h[1] for h in hyperplanes.values()])
+
+        # position of the vertices of each element with respect to each hyperplane
+        below = np.zeros((len(polytopes), len(offsets)), dtype=bool)
+        above = np.zeros((len(polytopes), len(offsets)), dtype=bool)
+        for i, p in enumerate(polytopes):
+            residuals = np.hstack(p.vertices).T.dot(normals.T) - offsets
+            below[i,:] = np.min(residuals, axis=0) < -tol
+            above[i,:] = np.max(residuals, axis=0) > tol
+
+            # elements that only touch a hyperplane (e.g. neighbors sharing a facet) are on one side only, degenerate elements lying on it on both
+            on_hyperplane = np.logical_not(np.logical_or(below[i,:], above[i,:]))
+            below[i,on_hyperplane] = True
+            above[i,on_hyperplane] = True
+
+        self.search_tree = self._build_node(range(len(self.elements)), normals, offsets, below, above)
+        return self.search_tree
+
+    def _build_node(self, indices, normals, offsets, below, above):
+
+        # a single element is left or no hyperplane splits the remaining elements
+        if len(indices) > 1:
+            n_below = np.sum(below[indices,:], axis=0)
+            n_above = np.sum(above[indices,:], axis=0)
+            best = np.lexsort((n_below + n_above, np.maximum(n_below, n_above)))[0]
+        if len(indices) == 1 or max(n_below[best], n_above[best]) == len(indices):
+            return SearchTreeNode(elements=[self.elements[i] for i in indices])
+
+        # split the elements and recur
+        indices_below = [i for i in indices if below[i,best]]
+        indices_above = [i for i in indices if above[i,best]]
+        children = [
+            self._build_node(indices_below, normals, offsets, below, above),
+            self._build_node(indices_above, normals, offsets, below, above)
+            ]
+        return SearchTreeNode(normals[best,:], offsets[best], children)
+
     def __len__(self):
         return len(self.elements)
 
     def __iter__(self):
         return iter(self.elements)
+
+
+def _element_polytope(element):
+    """
+    Returns the (assembled) polytope of an element: critical regions already store one, plain elements are converted.
+    """
+    polytope = getattr(element, 'polytope', None)
+    if polytope is None:
+        from pympc.geometry.polytope import Polytope
+        polytope = Polytope(element.polyhedron.A.astype(float), element.polyhedron.b.astype(float))
+        polytope.assemble()
+    return polytope
@@ -0,0 +1,137 @@
+import importlib
+from collections import OrderedDict
+
+class Backend:
+    """
+    LP and QP solver available to the package.
+
+    VARIABLES:
+        name: name of the backend (e.g. 'pnnls', 'gurobi')
+        module_name: module which provides the functions linear_program(f, A, b, C, d) and/or quadratic_program(H, f, A, b, C, d) (imported at the first use)
+        problems: list of the problem types the backend can solve ('lp' and/or 'qp')
+        max_size: largest problem (number of entries of the constraint matrices) for which the backend is chosen in auto mode (None for no limit)
+        check: function with no arguments which returns False if the backend cannot be used on this machine (e.g. missing license)
+    """
+
+    def __init__(self, name, module_name, problems, max_size=None, check=None):
+        self.name = name
+        self.module_name = module_name
+        self.problems = problems
+        self.max_size = max_size
+        self.check = check
+        self._available = None
+        return
+
+    def available(self):
+        """
+        Returns True if the module of the backend can be imported (and its check is passed); the result is computed only once.
+        """
+        if self._available is None:
+            try:
+                importlib.import_module(self.module_name)
+                self._available = self.check is None or bool(self.check())
+            except Exception:
+                self._available = False
+        return self._available
+
+    def solver(self, problem):
+        """
+        Returns the function which solves the given type of problem ('lp' or 'qp').
+        """
+        module = importlib.import_module(self.module_name)
+        return getattr(module, {'lp': 'linear_program', 'qp': 'quadratic_program'}[problem])
+
+def _check_gurobi():
+    """
+    Gurobi is available only if a model can be created (i.e. if a valid license is found).
+    """
+    import gurobipy as grb
+    from pympc.optimization.gurobi import suppress_stdout
+    with suppress_stdout():
+        grb.Model()
+    return True
+
+# backends in order of preference for the auto mode
+_backends = OrderedDict()
+_default_backend = 'auto'
+
+def register_backend(name, module_name, problems=('lp', 'qp'), max_size=None, check=None):
+    """
+    Adds a backend to the registry (or replaces the one with the same name), see Backend.
+    In auto mode the backends are considered in order of registration.
+    """
+    _backends[name] = Backend(name, module_name, problems, max_size, check)
+    return
+
+def available_backends(problem=None):
+    """
+    Returns the names of the registered backends which can be used on this machine (for the given type of problem, if provided).
+    """
+    return [name for name, backend in _backends.items() if backend.available() and (problem is None or problem in backend.problems)]
+
+def set_default_backend(name):
+    """
+    Sets the backend used when no backend is specified in the call ('auto' to select it on the basis of the problem size).
+    """
+    if name != 'auto' and name not in _backends:
+        raise ValueError('Unknown backend ' + str(name) + ', registered backends are ' + str(_backends.keys()) + '.')
+    global _default_backend
+    _default_backend = name
+    return
+
+def get_default_backend():
+    return _default_backend
+
+def select_backend(problem, size, exclude=None):
+    """
+    Returns the name of the first available backend (among the ones not in exclude) which solves the given type of problem and whose max_size is not smaller than size.
+    If no backend is large enough, the first available one is returned.
+    """
+    candidates = [name for name in available_backends(problem) if exclude is None or name not in exclude]
+    if not candidates:
+        raise ValueError('No backend available for the problem type ' + problem + '.')
+    for name in candidates:
+        max_size = _backends[name].max_size
+        if max_size is None or size <= max_size:
+            return name
+    return candidates[0]
+
+def _solver(problem, n_x, A, C, backend, exclude):
+    """
+    Returns the function of the requested backend, the default one, or the one selected by size in auto mode.
+    """
+    if backend is None:
+        backend = _default_backend
+    if backend == 'auto':
+        n_rows = sum(M.shape[0] for M in [A, C] if M is not None)
+        backend = select_backend(problem, n_x*n_rows, exclude)
+    elif backend not in _backends:
+        raise ValueError('Unknown backend ' + str(backend) + ', registered backends are ' + str(_backends.keys()) + '.')
+    return _backends[backend].solver(problem)
+
+def linear_program(f, A=None, b=None, C=None, d=None, backend=None, exclude=None):
+    """
+    Solves the linear program
+    min  f^T x
+    s.t. A x <= b
+         C x  = d
+    with the given backend (with the default one if backend is None, see set_default_backend()).
+    In auto mode the backends in exclude are not considered.
+    """
+    return _solver('lp', f.shape[0], A, C, backend, exclude)(f, A, b, C, d)
+
+def quadratic_program(H, f=None, A=None, b=None, C=None, d=None, backend=None, exclude=None):
+    """
+    Solves the strictly convex (H > 0) quadratic program
+    min  .5 x^T H x + f^T x
+    s.t. A x <= b
+         C x  = d
+    with the given backend (with the default one if backend is None, see set_default_backend()).
+    In auto mode the backends in exclude are not considered.
+    """
+    return _solver('qp', H.shape[0], A, C, backend, exclude)(H, f, A, b, C, d)
+
+# PNNLS is faster on small dense problems, the other solvers on large ones
+register_backend('pnnls', 'pympc.optimization.pnnls', max_size=10000)
+register_backend('gurobi', 'pympc.optimization.gurobi', check=_check_gurobi)
+register_backend('scipy', 'pympc.optimization.scipy_linprog', problems=('lp',))
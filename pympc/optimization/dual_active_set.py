@@ -0,0 +1,161 @@
+import numpy as np
+import scipy.linalg as linalg
+from collections import namedtuple
+from pympc.algebra import cholesky_append, cholesky_delete
+
+Solution = namedtuple('Solution',  ['argmin', 'min', 'active_set', 'inequality_multipliers', 'iterations'])
+
+
+def quadratic_program(H_inv, f, A, b, active_set=None, tol=1.e-8, max_iterations=None):
+    """
+    Solves the strictly convex quadratic program
+    min  .5 x^T H x + f^T x
+    s.t. A x <= b
+    with the dual active-set method of Goldfarb and Idnani ("A numerically stable dual method for solving strictly convex quadratic programs"): starting from a dual feasible point (the unconstrained minimum or the solution of the equality-constrained QP of the warm start active set), the most violated constraint is added to the active set at each iteration, possibly dropping some constraints to preserve dual feasibility, until the primal feasibility is reached.
+    The Cholesky factor of the Gram matrix A_active H^-1 A_active^T is updated when the active set changes (no matrix is factored from scratch), hence the method is well suited for small dense problems solved many times (e.g. receding-horizon control, where the active set of the previous step is a good warm start).
+
+    INPUTS:
+        H_inv: inverse of the Hessian of the cost function
+        f: linear term of the cost function
+        A: left-hand side of the constraints
+        b: right-hand side of the constraints
+        active_set: list of indices of the constraints used to warm start the solver
+        tol: tolerance on the violation of the constraints
+        max_iterations: maximum number of iterations (10 times the sum of the number of variables and constraints if not provided)
+
+    OUTPUTS:
+        argmin: argument which minimizes the cost (=nan if the QP is unfeasible)
+        min: minimum of the cost function (=nan if the QP is unfeasible)
+        active_set: sorted list of the indices of the active constraints (None if the QP is unfeasible)
+        inequality_multipliers: Lagrange multipliers of the constraints (=nan if the QP is unfeasible)
+        iterations: number of iterations of the solver
+    """
+
+    # problem dimensions
+    n_x = H_inv.shape[0]
+    n_ineq = A.shape[0]
+    f = np.reshape(f, (n_x,1))
+    b = np.reshape(b, (n_ineq,1))
+    if max_iterations is None:
+        max_iterations = 10*(n_x + n_ineq)
+    A_H_inv = A.dot(H_inv)
+    H_inv_f = H_inv.dot(f)
+
+    # dual feasible starting point
+    active_set, L, lam = _warm_start(A, A_H_inv, b, H_inv_f, active_set)
+    x = _primal_solution(A, H_inv, H_inv_f, active_set, lam)
+
+    # add the most violated constraint until the primal feasibility is reached
+    iterations = 0
+    while True:
+        residuals = A.dot(x) - b
+        residuals[active_set] = 0.
+        if n_ineq == 0 or np.max(residuals) <= tol:
+            break
+        p = np.argmax(residuals)
+        lam_p = 0.
+        while True:
+            iterations += 1
+            if iterations > max_iterations:
+                raise RuntimeError('Maximum number of iterations reached in the dual active-set QP solver.')
+
+            # primal and dual directions
+            a_p = A[p:p+1,:].T
+            if active_set:
+                dlam = - linalg.cho_solve((L, True), A_H_inv[active_set,:].dot(a_p))
+                dx = - H_inv.dot(a_p + A[active_set,:].T.dot(dlam))
+            else:
+                dlam = np.zeros((0,1))
+                dx = - H_inv.dot(a_p)
+
+            # largest step which preserves dual feasibility
+            t_dual = np.inf
+            blocking = None
+            for i in np.where(dlam.flatten() < 0.)[0]:
+                t_i = - lam[i,0]/dlam[i,0]
+                if t_i < t_dual:
+                    t_dual = t_i
+                    blocking = i
+
+            # step that makes the constraint p active
+            slope = a_p.T.dot(dx)[0,0]
+            t_primal = np.inf
+            if slope < - tol*np.linalg.norm(a_p):
+                t_primal = max(A[p,:].dot(x)[0] - b[p,0], 0.)/(- slope)
+
+            # unfeasible problem
+            if np.isinf(t_dual) and np.isinf(t_primal):
+                return Solution(
+                    argmin = np.full((n_x,1), np.nan),
+                    min = np.nan,
+                    active_set = None,
+                    inequality_multipliers = np.full((n_ineq,1), np.nan),
+                    iterations = iterations)
+
+            # take the step
+            t = min(t_dual, t_primal)
+            if not np.isinf(t_primal):
+                x = x + t*dx
+            lam = lam + t*dlam
+            lam_p += t
+
+            # full step: the constraint p becomes active
+            if t_primal <= t_dual:
+                L_new = cholesky_append(L, A_H_inv[active_set,:].dot(a_p), A_H_inv[p,:].dot(a_p)[0])
+                if L_new is not None:
+                    L = L_new
+                    active_set.append(p)
+                    lam = np.vstack((lam, [[lam_p]]))
+                break
+
+            # partial step: the blocking constraint is dropped
+            L = cholesky_delete(L, blocking)
+            active_set.pop(blocking)
+            lam = np.delete(lam, blocking, 0)
+
+    # polish the solution solving the KKT conditions of the final active set
+    if active_set:
+        lam = - linalg.cho_solve((L, True), b[active_set,:] + A_H_inv[active_set,:].dot(f))
+        lam = np.maximum(lam, 0.)
+    x = _primal_solution(A, H_inv, H_inv_f, active_set, lam)
+    multipliers = np.zeros((n_ineq,1))
+    multipliers[active_set,:] = lam
+    V = .5*f.T.dot(x)[0,0] - .5*lam.T.dot(b[active_set,:])[0,0] if active_set else .5*f.T.dot(x)[0,0]
+
+    return Solution(
+        argmin = x,
+        min = V,
+        active_set = sorted(active_set),
+        inequality_multipliers = multipliers,
+        iterations = iterations)
+
+def _warm_start(A, A_H_inv, b, H_inv_f, active_set):
+    """
+    Returns a dual feasible active set (with the Cholesky factor of its Gram matrix and its multipliers) contained in the given one: linearly dependent constraints are skipped and the constraints with negative multipliers are dropped one at a time.
+    """
+    L = np.zeros((0,0))
+    warm_active_set = []
+    if active_set is not None:
+        for i in active_set:
+            if i in warm_active_set:
+                continue
+            L_new = cholesky_append(L, A_H_inv[warm_active_set,:].dot(A[i:i+1,:].T), A_H_inv[i,:].dot(A[i,:]))
+            if L_new is not None:
+                L = L_new
+                warm_active_set.append(i)
+    while warm_active_set:
+        lam = - linalg.cho_solve((L, True), b[warm_active_set,:] + A[warm_active_set,:].dot(H_inv_f))
+        i = np.argmin(lam)
+        if lam[i,0] >= 0.:
+            return warm_active_set, L, lam
+        L = cholesky_delete(L, i)
+        warm_active_set.pop(i)
+    return warm_active_set, L, np.zeros((0,1))
+
+def _primal_solution(A, H_inv, H_inv_f, active_set, lam):
+    """
+    Returns the minimizer of the Lagrangian for the given multipliers of the active constraints.
+    """
+    if not active_set:
+        return - H_inv_f
+    return - H_inv_f - H_inv.dot(A[active_set,:].T.dot(lam))
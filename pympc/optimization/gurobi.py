@@ -1,6 +1,8 @@
 import gurobipy as grb
 import numpy as np
-from collections import namedtuple
+import scipy.sparse as sparse
+import os
+from collections import namedtuple, OrderedDict
 
 Solution = namedtuple('Solution',  ['min', 'argmin','inequality_multipliers', 'equality_multipliers',  'active_set'])
 
@@ -14,14 +16,13 @@ def linear_program(f, A=None, b=None, C=None, d=None, active_set=None):
     """
 
     # get model
-    model = build_model(f=f, A=A, b=b, C=C, d=d)
+    model = model_pool.get_model(f=f, A=A, b=b, C=C, d=d)
 
     # warm start
     if active_set is not None:
         model = warm_start(model, active_set, A, C)
 
     # run the optimization
-    model.setParam('OutputFlag', 0)
     model.optimize()
     #print model.Runtime
 
@@ -47,10 +48,9 @@ def quadratic_program(H, f=None, A=None, b=None, C=None, d=None):
     """
     
     # get model
-    model = build_model(H=H, f=f, A=A, b=b, C=C, d=d)
+    model = model_pool.get_model(H=H, f=f, A=A, b=b, C=C, d=d)
 
     # run the optimization
-    model.setParam('OutputFlag', False)
     model.optimize()
 
     # return result
@@ -74,32 +74,175 @@ def build_model(H=None, f=None, A=None, b=None, C=None, d=None):
     elif f is not None:
         n_x = max(f.shape)
     x = model.addVars(n_x, lb=[- grb.GRB.INFINITY]*n_x)
+    x = [x[i] for i in range(n_x)]
 
     # linear inequalities
     if A is not None and b is not None:
-        for i, expr in enumerate(linear_expression(A, b, x)):
-            model.addConstr(expr <= 0., name='ineq_'+str(i))
+        add_linear_constraints(model, A, x, grb.GRB.LESS_EQUAL, b, 'ineq_')
 
     # linear equalities
     if C is not None and d is not None:
-        for i, expr in enumerate(linear_expression(C, d, x)):
-            model.addConstr(expr == 0., name='eq_'+str(i))
+        add_linear_constraints(model, C, x, grb.GRB.EQUAL, d, 'eq_')
 
     # cost function
-    if H is not None:
-        cost = grb.QuadExpr()
-        expr = quadratic_expression(H, x)
-        cost.add(.5*expr)
-    else:
-        cost = grb.LinExpr()
-    if f is not None:
-        f = f.reshape(1, max(f.shape))
-        expr = linear_expression(f, np.zeros((1,1)), x)
-        cost.add(expr[0])
-    model.setObjective(cost)
+    set_quadratic_objective(model, H, f, x)
 
     return model
 
+def add_linear_constraints(model, A, x, sense, b, name=None, tol=1.e-7):
+    """
+    Adds the constraints A x <= b (or A x = b, A x >= b, depending on sense) to the model with a single call to the matrix interface of Gurobi (the entries of A and b smaller than tol are set to zero).
+    If name is provided, the i-th constraint is named name + str(i).
+
+    INPUTS:
+        model: Gurobi model
+        A: left-hand side of the constraints (NumPy or SciPy sparse matrix)
+        x: list of Gurobi variables
+        sense: grb.GRB.LESS_EQUAL, grb.GRB.EQUAL or grb.GRB.GREATER_EQUAL
+        b: right-hand side of the constraints
+    """
+    if A.shape[0] == 0:
+        return
+    if name is not None:
+        model.update()
+        n_constrs = model.NumConstrs
+    model.addMConstr(clean_sparse_matrix(A, tol), x, sense, np.reshape(clean_sparse_matrix(b, tol).toarray(), A.shape[0]))
+    if name is not None:
+        model.update()
+        constrs = model.getConstrs()[n_constrs:]
+        model.setAttr('ConstrName', constrs, [name + str(i) for i in range(len(constrs))])
+    return
+
+def set_quadratic_objective(model, H, f, x, tol=1.e-7):
+    """
+    Sets the cost function .5 x^T H x + f^T x (H and f can be None) with a single call to the matrix interface of Gurobi.
+    """
+    Q = None if H is None else .5*clean_sparse_matrix(H, tol)
+    c = None if f is None else np.reshape(clean_sparse_matrix(f, tol).toarray(), len(x))
+    model.setMObjective(Q, c, 0., x, x, x)
+    return
+
+def clean_sparse_matrix(M, tol=1.e-7):
+    """
+    Returns M as a SciPy sparse matrix, dropping the entries smaller than tol.
+    """
+    M = sparse.csr_matrix(M)
+    M.data[np.abs(M.data) <= tol] = 0.
+    M.eliminate_zeros()
+    return M
+
+class ModelPool:
+    """
+    Pool of Gurobi models for the solution of many LPs and QPs with the same structure.
+    The models are indexed by the number of variables and by the sparsity patterns of H, A and C: when a program with an already seen structure has to be solved, the stored model is reused and only the coefficients that changed, the cost and the right-hand sides are updated (the construction of the model, entry by entry, is often more expensive than the optimization itself).
+
+    VARIABLES:
+        max_size: maximum number of models in the pool (the least recently used model is discarded when the pool is full)
+        models: ordered dictionary structure key -> dictionary with the model, the variables, the constraints and the matrices currently stored in it
+    """
+
+    def __init__(self, max_size=100, tol=1.e-7):
+        self.max_size = max_size
+        self.tol = tol
+        self.models = OrderedDict()
+        self.pid = os.getpid()
+        return
+
+    def key(self, n_x, H=None, A=None, C=None):
+        """
+        Returns the key of a program: number of variables and sparsity patterns of the matrices.
+        """
+        key = [n_x]
+        for M in [H, A, C]:
+            if M is None:
+                key.append(None)
+            else:
+                pattern = np.abs(M) > self.tol
+                key.append((pattern.shape, np.packbits(pattern).tostring()))
+        return tuple(key)
+
+    def get_model(self, H=None, f=None, A=None, b=None, C=None, d=None):
+        """
+        Returns a model for the given program (same arguments as build_model()) ready to be optimized.
+        """
+
+        # models cannot be shared with forked processes
+        if os.getpid() != self.pid:
+            self.models = OrderedDict()
+            self.pid = os.getpid()
+
+        # check the dimensions
+        if H is not None:
+            n_x = H.shape[0]
+        else:
+            n_x = max(f.shape)
+        if A is not None and b is None:
+            A = None
+        if C is not None and d is None:
+            C = None
+
+        # retrieve the model or build a new one
+        key = self.key(n_x, H, A, C)
+        if key in self.models:
+            entry = self.models.pop(key)
+            self._update_coefficients(entry, H, A, C)
+            entry['model'].reset()
+        else:
+            entry = self._new_entry(n_x, H, A, C)
+            if len(self.models) >= self.max_size:
+                self.models.popitem(last=False)
+        self.models[key] = entry
+
+        # cost function
+        model = entry['model']
+        f = np.zeros(n_x) if f is None else np.reshape(f, n_x)
+        model.setAttr('Obj', entry['x'], f.tolist())
+
+        # right-hand sides
+        if A is not None:
+            model.setAttr('RHS', entry['ineq'], np.reshape(b, A.shape[0]).tolist())
+        if C is not None:
+            model.setAttr('RHS', entry['eq'], np.reshape(d, C.shape[0]).tolist())
+
+        return model
+
+    def _new_entry(self, n_x, H, A, C):
+        """
+        Builds a model with the given matrices, null cost and null right-hand sides.
+        """
+        model = build_model(H=H, f=np.zeros((n_x,1)), A=A, b=None if A is None else np.zeros((A.shape[0],1)), C=C, d=None if C is None else np.zeros((C.shape[0],1)))
+        model.setParam('OutputFlag', False)
+        model.update()
+        constrs = model.getConstrs()
+        n_ineq = 0 if A is None else A.shape[0]
+        return {
+            'model': model,
+            'x': model.getVars(),
+            'ineq': constrs[:n_ineq],
+            'eq': constrs[n_ineq:],
+            'H': None if H is None else np.array(H),
+            'A': None if A is None else np.array(A),
+            'C': None if C is None else np.array(C)
+            }
+
+    def _update_coefficients(self, entry, H, A, C):
+        """
+        Changes the coefficients of the constraints (and the quadratic cost) of a stored model which differ from the new ones.
+        """
+        model = entry['model']
+        x = entry['x']
+        for M, name, constrs in [(A, 'A', entry['ineq']), (C, 'C', entry['eq'])]:
+            if M is not None and not np.array_equal(M, entry[name]):
+                for i, j in zip(*np.where((M != entry[name]) & (np.abs(M) > self.tol))):
+                    model.chgCoeff(constrs[i], x[j], M[i,j])
+                entry[name] = np.array(M)
+        if H is not None and not np.array_equal(H, entry['H']):
+            set_quadratic_objective(model, H, None, x, self.tol)
+            entry['H'] = np.array(H)
+        return
+
+model_pool = ModelPool()
+
 def warm_start(model, active_set, A, C):
 
     # retrieve variables
@@ -185,23 +328,26 @@ def get_active_set_qp(model, ineq_mult, tol=1.e-6):
     return active_set
   
 def linear_expression(A, b, x, tol=1.e-7):
+    """
+    Returns the list of the expressions A x - b (one for each row, built from the nonzero entries of A only).
+    """
+    A = clean_sparse_matrix(A, tol)
     exprs = []
     for i in range(A.shape[0]):
-        expr = grb.LinExpr()
-        for j in range(A.shape[1]):
-            if np.abs(A[i,j]) > tol:
-                expr.add(A[i,j]*x[j])
+        row = A.getrow(i)
+        expr = grb.LinExpr(row.data.tolist(), [x[j] for j in row.indices])
         if np.abs(b[i]) > tol:
-            expr.add(-b[i])
+            expr.addConstant(-float(b[i]))
         exprs.append(expr)
     return exprs
 
 def quadratic_expression(H, x, tol=1.e-7):
+    """
+    Returns the expression x' H x (built from the nonzero entries of H only).
+    """
+    H = sparse.coo_matrix(clean_sparse_matrix(H, tol))
     expr = grb.QuadExpr()
-    for i in range(H.shape[0]):
-        for j in range(H.shape[1]):
-            if np.abs(H[i,j]) > tol:
-                expr.add(x[i]*H[i,j]*x[j])
+    expr.addTerms(H.data.tolist(), [x[i] for i in H.row], [x[j] for j in H.col])
     return expr
 
 def quadratically_constrained_linear_program(f, A=None, b=None, C=None, d=None, P=None, q=None, r=None, tol=1.e-9):
@@ -212,44 +358,22 @@ def quadratically_constrained_linear_program(f, A=None, b=None, C=None, d=None,
     # optimization variables
     n_x = f.shape[0]
     x = model.addVars(n_x, lb=[- grb.GRB.INFINITY]*n_x, name='x')
+    x = [x[i] for i in range(n_x)]
 
     # linear inequalities
     if A is not None and b is not None:
-        for i in range(A.shape[0]):
-            lhs = grb.LinExpr()
-            for j in range(n_x):
-                if np.abs(A[i,j]) > tol:
-                    lhs.add(A[i,j]*x[j])
-            model.addConstr(lhs <= b[i])
+        add_linear_constraints(model, A, x, grb.GRB.LESS_EQUAL, b, tol=tol)
 
     # linear equalities
     if C is not None and d is not None:
-        for i in range(C.shape[0]):
-            lhs = grb.LinExpr()
-            for j in range(n_x):
-                if np.abs(C[i,j]) > tol:
-                    lhs.add(C[i,j]*x[j])
-            model.addConstr(lhs == d[i])
+        add_linear_constraints(model, C, x, grb.GRB.EQUAL, d, tol=tol)
 
     # quadratic inequalities
-    lhs = grb.QuadExpr()
-    for i in range(n_x):
-        for j in range(n_x):
-            if np.abs(P[i,j]) > tol:
-                lhs.add(x[i]*P[i,j]*x[j])
-    if q is not None:
-        for i in range(n_x):
-            if np.abs(q[i,0]) > tol:
-                lhs.add(q[i,0]*x[i])
-    model.addConstr(lhs <= r)
+    q = None if q is None else np.reshape(clean_sparse_matrix(q, tol).toarray(), n_x)
+    model.addMQConstr(clean_sparse_matrix(P, tol), q, grb.GRB.LESS_EQUAL, float(np.reshape(r, -1)[0]), x, x, x)
 
     # cost function
-    f = np.reshape(f, (n_x, 1))
-    cost = grb.LinExpr()
-    for i in range(n_x):
-        if np.abs(f[i,0]) > tol:
-            cost.add(f[i,0]*x[i])
-    model.setObjective(cost)
+    set_quadratic_objective(model, None, f, x, tol)
 
     # run the optimization
     model.setParam('OutputFlag', False)
@@ -257,8 +381,8 @@ def quadratically_constrained_linear_program(f, A=None, b=None, C=None, d=None,
     model.setParam(grb.GRB.Param.FeasibilityTol, 1.e-9)
     model.optimize()
 
-    x_star = np.array([[model.getAttr('x', x)[i]] for i in range(n_x)])
-    V_star = cost.getValue()
+    x_star = np.reshape(model.getAttr('x', x), (n_x, 1))
+    V_star = model.objVal
 
     return x_star, V_star
 
@@ -0,0 +1,189 @@
+import numpy as np
+import time
+from scipy.optimize import nnls
+from pympc.ndpiecewise import NDPiecewise
+from backends import linear_program
+from pympc.geometry.polytope import Polytope
+
+class MPLPSolver:
+    """
+    Solves a mp-LP in the form
+    z^*(x) = argmin_z f' z
+    subject to A z <= B x + c
+    (see ParametricLP.add_slack_variables()) exploring the parameter space facet by facet: a point is taken slightly beyond each facet of each critical region, the LP is solved there and the critical region of the optimal basis is added to the solution (Baotic - "An efficient algorithm for multi-parametric quadratic programming", Spjotvold et al. - "Facet enumeration approach for mp-LPs").
+    In case of dual degeneracy the critical regions of different optimal bases can overlap, but any of them returns an optimal solution.
+    """
+
+    def __init__(self, canonical_lp, initial_parameter=None, max_step=1.e-3):
+        """
+        The exploration starts from initial_parameter (the origin if not provided), where the LP must be feasible.
+        """
+
+        self.lp = canonical_lp
+        n_x = self.lp.B.shape[1]
+
+        # start clock
+        tic = time.time()
+
+        # initialize the search (the region of the initial parameter can be lower dimensional, e.g. the origin for MPC problems, or the LP can be unfeasible at the boundary of the feasible set, hence random close points are tried)
+        if initial_parameter is None:
+            initial_parameter = np.zeros((n_x, 1))
+        perturbations = np.random.RandomState(0).randn(n_x, 10)*max_step
+        for k in range(perturbations.shape[1]):
+            cr0 = self.critical_region_at(initial_parameter + perturbations[:,k:k+1])
+            if cr0 is not None and not cr0.polytope.empty:
+                break
+        if cr0 is None or cr0.polytope.empty:
+            raise ValueError('Cannot find a critical region around the initial parameter ' + str(initial_parameter.flatten().tolist()))
+        explored_cr = [cr0]
+        cr_to_be_explored = [cr0]
+        neighbors = [[[] for i in range(len(cr0.polytope.minimal_facets))]]
+
+        # explore the state space crossing each facet of each CR
+        while cr_to_be_explored:
+            cr = cr_to_be_explored.pop(0)
+            i = explored_cr.index(cr)
+            for facet_index in range(len(cr.polytope.minimal_facets)):
+
+                # point beyond the center of the facet
+                dist = min(cr.polytope.facet_radii(facet_index)/10., cr.polytope.radius/10., max_step)
+                x_beyond = cr.polytope.facet_centers(facet_index) + dist*cr.polytope.lhs_min[facet_index:facet_index+1,:].T
+
+                # the point is already covered by a CR
+                covering = [j for j, explored in enumerate(explored_cr) if explored.applies_to(x_beyond)]
+                if covering:
+                    neighbors[i][facet_index].append(covering[0])
+                    continue
+
+                # new critical region (None if the point is outside the feasible set)
+                new_cr = self.critical_region_at(x_beyond)
+                if new_cr is None:
+                    continue
+                if new_cr.polytope.empty:
+                    print('Lower dimensional critical region detected beyond the facet ' + str(facet_index) + ' of the critical region ' + str(i))
+                    continue
+                neighbors[i][facet_index].append(len(explored_cr))
+                explored_cr.append(new_cr)
+                cr_to_be_explored.append(new_cr)
+                neighbors.append([[] for j in range(len(new_cr.polytope.minimal_facets))])
+
+        # collect all the critical regions and report the result
+        self.critical_regions = NDPiecewise(explored_cr, neighbors)
+        toc = time.time()
+        print('\nExplicit solution computed in ' + str(toc-tic) + ' s:')
+        print('parameter space partitioned in ' + str(len(self.critical_regions)) + ' critical regions.')
+
+    def critical_region_at(self, x):
+        """
+        Solves the LP for the parameter x and returns the critical region of an optimal basis (None if the LP is unfeasible).
+        """
+        print('Computing critical region for the parameter ' + str(x.flatten().tolist()))
+        b = self.lp.B.dot(x) + self.lp.c
+        sol = linear_program(self.lp.f, self.lp.A, b)
+        if np.isnan(sol.min):
+            return None
+        basis = self.optimal_basis(sol.argmin, sol.min, b)
+        if basis is None:
+            print('    cannot find an optimal basis')
+            return None
+        return LPCriticalRegion(basis, self.lp)
+
+    def optimal_basis(self, z, V, b, tol=1.e-7):
+        """
+        Given an optimal solution z of the LP with right-hand side b (and optimal value V), returns a basis (list of n_var linearly independent active constraints) which is both primal and dual feasible (None if it can't be found).
+
+        INPUTS:
+            z: optimal solution of the LP
+            V: optimal value of the LP
+            b: right-hand side of the constraints of the LP
+
+        OUTPUTS:
+            basis: sorted list of the indices of the basic constraints
+        """
+        A = self.lp.A
+        n_var = A.shape[1]
+
+        # in case of dual degeneracy z can be in the relative interior of the optimal face: move to one of its vertices
+        active_set = list(np.where(A.dot(z) - b > -tol)[0])
+        if np.linalg.matrix_rank(A[active_set,:]) < n_var:
+            direction = np.random.RandomState(0).randn(n_var, 1)
+            z = linear_program(direction, A, b, self.lp.f.T, np.array([[V]])).argmin
+            if any(np.isnan(z)):
+                return None
+            active_set = list(np.where(A.dot(z) - b > -tol)[0])
+            if np.linalg.matrix_rank(A[active_set,:]) < n_var:
+                return None
+
+        # the support of a basic solution of the KKT conditions A_active' lambda = - f, lambda >= 0 gives the dual feasible part of the basis
+        lam = nnls(A[active_set,:].T, - self.lp.f.flatten())[0]
+        basis = [active_set[i] for i in np.where(lam > tol)[0]]
+        if np.linalg.matrix_rank(A[basis,:]) < len(basis):
+            basis = []
+
+        # complete the basis with the other active constraints (with null multipliers)
+        for i in active_set:
+            if len(basis) == n_var:
+                break
+            if i not in basis and np.linalg.matrix_rank(A[basis + [i],:]) == len(basis) + 1:
+                basis.append(i)
+        return sorted(basis)
+
+
+class LPCriticalRegion:
+    """
+    Critical region of an optimal basis of a mp-LP.
+
+    VARIABLES:
+        basis: list of the indices of the basic constraints
+        non_basis: list of the indices of the other constraints
+        polytope: polytope describing the ceritical region in the parameter space (empty if the region is lower dimensional)
+        z_linear: linear term in the piecewise affine primal solution z_opt = z_linear*x + z_offset
+        z_offset: offset term in the piecewise affine primal solution z_opt = z_linear*x + z_offset
+        u_linear: linear term in the piecewise affine solution of the original variables u_opt = u_linear*x + u_offset
+        u_offset: offset term in the piecewise affine solution of the original variables u_opt = u_linear*x + u_offset
+        V_quadratic, V_linear, V_offset: terms of the optimal value function V_star = .5 x' V_quadratic x + V_linear x + V_offset (V_quadratic is zero, it is stored for compatibility with the critical regions of the mp-QPs)
+    """
+
+    def __init__(self, basis, lp, tol=1.e-9):
+        self.basis = basis
+        self.non_basis = sorted(list(set(range(lp.A.shape[0])) - set(basis)))
+        n_u = lp.F_u.shape[1]
+        n_x = lp.B.shape[1]
+
+        # primal explicit solution
+        A_B_inv = np.linalg.inv(lp.A[basis,:])
+        self.z_linear = A_B_inv.dot(lp.B[basis,:])
+        self.z_offset = A_B_inv.dot(lp.c[basis,:])
+        self.u_linear = self.z_linear[:n_u,:]
+        self.u_offset = self.z_offset[:n_u,:]
+
+        # optimal value function explicit solution
+        self.V_quadratic = np.zeros((n_x, n_x))
+        self.V_linear = lp.f.T.dot(self.z_linear)
+        self.V_offset = lp.f.T.dot(self.z_offset)
+
+        # primal feasibility of the non-basic constraints (constraints that do not depend on the parameter are dropped)
+        lhs = lp.A[self.non_basis,:].dot(self.z_linear) - lp.B[self.non_basis,:]
+        rhs = lp.c[self.non_basis,:] - lp.A[self.non_basis,:].dot(self.z_offset)
+        rows = np.where(np.linalg.norm(lhs, axis=1) > tol)[0]
+        self.polytope = Polytope(lhs[rows,:], rhs[rows,:])
+        self.polytope.assemble(check_emptiness=True, check_boundedness=False, check_coincidences=False, check_redundancy=False)
+
+        # lower dimensional regions are considered empty
+        if not self.polytope.empty and self.polytope.radius < tol:
+            self.polytope.empty = True
+        if not self.polytope.empty:
+            self.polytope.find_minimal_facets()
+        return
+
+    def z_optimal(self, x):
+        """
+        Returns the explicit solution of the mp-LP as a function of the parameter.
+        """
+        return self.z_offset + self.z_linear.dot(x)
+
+    def applies_to(self, x):
+        """
+        Determines is a given point belongs to the critical region (see Polytope.applies_to() for a matrix of points).
+        """
+        return self.polytope.applies_to(x)
@@ -2,10 +2,19 @@ import numpy as np
 import scipy.linalg as linalg
 import itertools
 import time
+import os
+import ast
+import hashlib
+import multiprocessing
+import h5py
+from contextlib import contextmanager
 from pympc.ndpiecewise import NDPiecewise
-from pnnls import linear_program
-from gurobi import quadratic_program
-from pympc.geometry.polytope import Polytope
+from solver_statistics import SolverStatistics
+from pnnls import QuadraticProgram
+from backends import linear_program
+from pympc.geometry.polytope import Polytope, upload_Polytope
+from pympc.geometry.chebyshev_center import chebyshev_center
+from pympc.algebra import cholesky_append, cholesky_delete
 
 class MPQPSolver:
     """
@@ -14,41 +23,233 @@ class MPQPSolver:
     subject to G u <= W + E x
     """
 
-    def __init__(self, canonical_qp):
+    def __init__(self, canonical_qp, n_processes=1, checkpoint_name=None, checkpoint_interval=600., time_limit=None, region_of_interest=None, cache=None, statistics=False):
+        """
+        If n_processes > 1 the critical regions of the pending active sets are computed by a pool of worker processes (the coordinator keeps track of the tested active sets).
+        If checkpoint_name is provided, the state of the exploration (explored critical regions, frontier and tested active sets) is saved in the file checkpoint_name.hdf5 every checkpoint_interval seconds and when the exploration stops; if the file already exists, the exploration is resumed from it (the checkpoint stores the fingerprint of the mpQP and the region of interest, and a ValueError is raised if they do not match).
+        If time_limit is provided, the exploration is interrupted after time_limit seconds: the solution then contains only the critical regions explored so far and the flag complete is False.
+        If region_of_interest (assembled Polytope in the parameter space) is provided, every critical region is intersected with it and the facets of the region of interest are not crossed, hence only the part of the feasible set inside the region of interest is partitioned (the exploration starts from the active set at a feasible point inside the region of interest, see feasible_point_in(), and a ValueError is raised if there is none).
+        If cache (CriticalRegionCache) is provided, the critical regions are read from it when available and the new ones are added to it.
+        If statistics is True, the time spent in each phase of the algorithm, the number of LPs and QPs solved, the degeneracies and the size of the frontier are collected in the attribute statistics (SolverStatistics, otherwise statistics is None).
+        """
 
         self.qp = canonical_qp
+        self.qp_solver = QuadraticProgram(self.qp.H, self.qp.G)
+        self.statistics = None
+        if statistics:
+            self.statistics = SolverStatistics()
+        self.region_of_interest = region_of_interest
+        self.cache = cache
+        self.fingerprint = CriticalRegionCache.fingerprint(self.qp, self.region_of_interest)
 
         # start clock
         tic = time.time()
 
-        # initialize the search with the origin (to which the empty AS is associated)
-        active_set = []
-        cr0 = CriticalRegion(active_set, self.qp)
-        cr_to_be_explored = [cr0]
-        explored_cr = []
-        tested_active_sets =[cr0.active_set]
+        # number of critical regions read from the cache
+        self.cache_hits = 0
 
-        # explore the state space
-        while cr_to_be_explored:
+        # factorizations of the Gram matrices of the explored CRs and indices of the crossed facets, passed to the CRs that are found crossing their facets
+        self.parents = dict()
 
-            # choose the first candidate in the list and remove it
-            cr = cr_to_be_explored[0]
-            cr_to_be_explored = cr_to_be_explored[1:]
+        # pool of workers for the computation of the critical regions
+        pool = None
+        if n_processes > 1:
+            pool = multiprocessing.Pool(n_processes, _initialize_worker, (self.qp, self.region_of_interest))
 
-            # if the CR is not empty, find all the potential neighbors
-            if cr.polytope.empty:
-                print('Empty critical region detected')
-            else:
-                [cr_to_be_explored, tested_active_sets] = self.spread_critical_region(cr, cr_to_be_explored, tested_active_sets)
-                explored_cr.append(cr)
+        # explore (the workers are stopped also if the exploration fails or is interrupted)
+        try:
+            # resume the search from the checkpoint
+            if checkpoint_name is not None and os.path.isfile(checkpoint_name + '.hdf5'):
+                with self.timer('checkpoint'):
+                    [explored_cr, cr_to_be_explored, tested_active_sets] = self.load_checkpoint(checkpoint_name)
+                print('Exploration resumed from ' + checkpoint_name + '.hdf5 with ' + str(len(explored_cr)) + ' explored critical regions.')
 
-        # collect all the critical regions and report the result
-        self.critical_regions = NDPiecewise(explored_cr)
+            # initialize the search with the origin (to which the empty AS is associated) or with a feasible point inside the region of interest
+            else:
+                active_set = []
+                if self.region_of_interest is not None:
+                    active_set = self.active_set_in(self.feasible_point_in(self.region_of_interest))
+                cr0 = self.compute_critical_regions([active_set])[0]
+                cr_to_be_explored = [cr0]
+                explored_cr = []
+                tested_active_sets =[cr0.active_set]
+                self.corrected_active_sets = dict()
+
+            # explore the state space (one layer of the frontier at the time)
+            self.complete = True
+            last_checkpoint = time.time()
+            while cr_to_be_explored:
+                if self.statistics is not None:
+                    self.statistics.record_frontier(len(cr_to_be_explored), len(explored_cr))
+                active_sets_to_be_explored = []
+                for cr in cr_to_be_explored:
+
+                    # if the CR is not empty, find all the potential neighbors
+                    if cr.polytope.empty:
+                        print('Empty critical region detected')
+                    else:
+                        with self.timer('spread_critical_regions'):
+                            [active_sets_to_be_explored, tested_active_sets] = self.spread_critical_region(cr, active_sets_to_be_explored, tested_active_sets)
+                        explored_cr.append(cr)
+
+                # compute the critical regions of the next layer
+                cr_to_be_explored = self.compute_critical_regions(active_sets_to_be_explored, pool)
+
+                # periodically save the state of the exploration
+                if checkpoint_name is not None and time.time() - last_checkpoint > checkpoint_interval:
+                    with self.timer('checkpoint'):
+                        self.save_checkpoint(checkpoint_name, explored_cr, cr_to_be_explored, tested_active_sets)
+                    last_checkpoint = time.time()
+
+                # stop the exploration if the time is over
+                if time_limit is not None and time.time() - tic > time_limit and cr_to_be_explored:
+                    print('Time limit reached: exploration interrupted with ' + str(len(cr_to_be_explored)) + ' critical regions to be explored.')
+                    self.complete = False
+                    break
+
+        # stop the workers
+        except:
+            if pool is not None:
+                pool.terminate()
+            raise
+        else:
+            if pool is not None:
+                pool.close()
+        finally:
+            if pool is not None:
+                pool.join()
+
+        # save the final state of the exploration
+        if checkpoint_name is not None:
+            with self.timer('checkpoint'):
+                self.save_checkpoint(checkpoint_name, explored_cr, cr_to_be_explored, tested_active_sets)
+
+        # collect all the critical regions (with their adjacency graph) and report the result
+        with self.timer('adjacency_graph'):
+            self.critical_regions = NDPiecewise(explored_cr, self.adjacency_graph(explored_cr))
         toc = time.time()
+        if self.statistics is not None:
+            self.statistics.add_time('total', toc - tic)
+            self.statistics.count('explored_critical_regions', len(explored_cr))
         print('\nExplicit solution computed in ' + str(toc-tic) + ' s:')
         print('parameter space partitioned in ' + str(len(self.critical_regions)) + ' critical regions.')
+        if cache is not None:
+            print(str(self.cache_hits) + ' critical regions read from the cache.')
+
+    def timer(self, phase):
+        """
+        Context manager that adds the time spent in the with-block to the statistics of the given phase (it does nothing if the statistics are not collected).
+        """
+        if self.statistics is None:
+            return _no_timer()
+        return self.statistics.timer(phase)
+
+    def count(self, event, n=1):
+        if self.statistics is not None:
+            self.statistics.count(event, n)
+        return
 
-    def spread_critical_region(self, cr, cr_to_be_explored, tested_active_sets):
+    def save_checkpoint(self, checkpoint_name, explored_cr, cr_to_be_explored, tested_active_sets):
+        """
+        Saves the state of the exploration in the file checkpoint_name.hdf5 (the file is written under a temporary name and then renamed, so that a crash while writing does not corrupt the previous checkpoint).
+        """
+
+        # open the file
+        group = h5py.File(checkpoint_name + '.tmp.hdf5', 'w')
+
+        # write critical regions (empty CRs in the frontier would be discarded anyway)
+        explored = group.create_group('explored_critical_regions')
+        for i, cr in enumerate(explored_cr):
+            explored = cr.save(str(i), explored)
+        frontier = group.create_group('critical_regions_to_be_explored')
+        for i, cr in enumerate([cr for cr in cr_to_be_explored if not cr.polytope.empty]):
+            frontier = cr.save(str(i), frontier)
+
+        # write active sets
+        group.create_dataset('tested_active_sets', data=np.string_(str(tested_active_sets)))
+        group.create_dataset('corrected_active_sets', data=np.string_(str(self.corrected_active_sets)))
+
+        # write the fingerprint of the mpQP and the region of interest (see CriticalRegionCache.fingerprint())
+        group.create_dataset('fingerprint', data=np.string_(self.fingerprint))
+        if self.region_of_interest is not None:
+            group = self.region_of_interest.save('region_of_interest', group)
+
+        # close the file and replace the previous checkpoint
+        group.close()
+        os.rename(checkpoint_name + '.tmp.hdf5', checkpoint_name + '.hdf5')
+        return
+
+    def load_checkpoint(self, checkpoint_name):
+        """
+        Reads the state of the exploration from the file checkpoint_name.hdf5 (see save_checkpoint()).
+        Raises a ValueError if the checkpoint has been generated by a different mpQP or with a different region of interest.
+        """
+
+        # open the file and check that the checkpoint belongs to this mpQP and region of interest
+        group = h5py.File(checkpoint_name + '.hdf5', 'r')
+        if 'region_of_interest' in group:
+            region_of_interest = upload_Polytope('region_of_interest', group)
+            same_region_of_interest = self.region_of_interest is not None and region_of_interest.A.shape == self.region_of_interest.A.shape and np.allclose(region_of_interest.A, self.region_of_interest.A) and np.allclose(region_of_interest.b, self.region_of_interest.b)
+        else:
+            same_region_of_interest = self.region_of_interest is None
+        if not same_region_of_interest:
+            group.close()
+            raise ValueError('The checkpoint ' + checkpoint_name + '.hdf5 has been generated with a different region of interest.')
+        if 'fingerprint' not in group or str(group['fingerprint'][()]) != self.fingerprint:
+            group.close()
+            raise ValueError('The checkpoint ' + checkpoint_name + '.hdf5 has been generated by a different mpQP.')
+
+        # read critical regions
+        explored_cr = [upload_CriticalRegion(str(i), group['explored_critical_regions']) for i in range(len(group['explored_critical_regions']))]
+        cr_to_be_explored = [upload_CriticalRegion(str(i), group['critical_regions_to_be_explored']) for i in range(len(group['critical_regions_to_be_explored']))]
+
+        # read active sets
+        tested_active_sets = ast.literal_eval(str(group['tested_active_sets'][()]))
+        self.corrected_active_sets = ast.literal_eval(str(group['corrected_active_sets'][()]))
+
+        # close the file and return
+        group.close()
+        return [explored_cr, cr_to_be_explored, tested_active_sets]
+
+    def compute_critical_regions(self, active_sets, pool=None):
+        """
+        Returns the list of the critical regions associated with the given active sets (computed by the pool of workers, if provided).
+        If a cache is available, only the critical regions that are not in the cache are computed.
+        """
+
+        # read the cache
+        critical_regions = [None] * len(active_sets)
+        if self.cache is not None:
+            with self.timer('cache'):
+                critical_regions = [self.cache.get(self.fingerprint, active_set) for active_set in active_sets]
+            hits = len([cr for cr in critical_regions if cr is not None])
+            self.cache_hits += hits
+            self.count('cache_hits', hits)
+        missing = [i for i, cr in enumerate(critical_regions) if cr is None]
+
+        # factorizations and shared facets of the parents (removed for all the active sets, read from the cache or not, so that the bookkeeping does not depend on the content of the cache)
+        parents = [self.parents.pop(tuple(active_set), [None, None]) for active_set in active_sets]
+
+        # compute the missing critical regions
+        args = [tuple([active_sets[i]] + parents[i]) for i in missing]
+        with self.timer('compute_critical_regions'):
+            if pool is None:
+                computed = [CriticalRegion(active_set, self.qp, self.region_of_interest, parent_gram_factor, shared_facets) for active_set, parent_gram_factor, shared_facets in args]
+            else:
+                computed = pool.map(_compute_critical_region, args)
+        for i, cr in zip(missing, computed):
+            critical_regions[i] = cr
+            if self.statistics is not None:
+                self.statistics.add_critical_region(cr)
+            if self.cache is not None:
+                with self.timer('cache'):
+                    self.cache.put(self.fingerprint, cr)
+        return critical_regions
+
+    def spread_critical_region(self, cr, active_sets_to_be_explored, tested_active_sets):
+
+        # active sets found crossing each facet of the CR (used to build the adjacency graph)
+        cr.neighbor_active_sets = [[] for i in range(len(cr.polytope.minimal_facets))]
 
         # for all the facets of the CR and all candidate active sets across each facet
         for facet_index in range(0, len(cr.polytope.minimal_facets)):
@@ -59,22 +260,75 @@ class MPQPSolver:
                     tested_active_sets.append(active_set)
 
                     # check LICQ for the given active set
-                    licq_flag = self.licq_check(self.qp.G, active_set)
+                    with self.timer('licq_check'):
+                        licq_flag = self.licq_check(self.qp.G, active_set)
+                    self.count('licq_checks')
 
                     # if LICQ holds, determine the critical region
                     if licq_flag:
-                        cr_to_be_explored.append(CriticalRegion(active_set, self.qp))
+                        active_sets_to_be_explored.append(active_set)
+                        self.parents[tuple(active_set)] = [getattr(cr, 'gram_factor', None), self.shared_facets(cr.active_set, active_set)]
+                        cr.neighbor_active_sets[facet_index].append(active_set)
 
                     # if LICQ doesn't hold, correct the active set and determine the critical region
                     else:
                         print('LICQ does not hold for the active set ' + str(active_set))
-                        active_set = self.active_set_if_not_licq(active_set, facet_index, cr)
+                        self.count('licq_failures')
+                        candidate_active_set = active_set
+                        with self.timer('degeneracy'):
+                            active_set = self.active_set_if_not_licq(active_set, facet_index, cr)
+                        self.corrected_active_sets[tuple(candidate_active_set)] = active_set
+                        if active_set:
+                            cr.neighbor_active_sets[facet_index].append(active_set)
                         if active_set and active_set not in tested_active_sets:
                             print('    corrected active set ' + str(active_set))
-                            cr_to_be_explored.append(CriticalRegion(active_set, self.qp))
+                            tested_active_sets.append(active_set)
+                            active_sets_to_be_explored.append(active_set)
+                            self.parents[tuple(active_set)] = [getattr(cr, 'gram_factor', None), None]
                         else:
                             print('    unfeasible critical region detected')
-        return [cr_to_be_explored, tested_active_sets]
+                            self.count('unfeasible_corrected_active_sets')
+
+                # the active set has already been explored from another CR
+                else:
+                    active_set = self.corrected_active_sets.get(tuple(active_set), active_set)
+                    if active_set:
+                        cr.neighbor_active_sets[facet_index].append(active_set)
+        return [active_sets_to_be_explored, tested_active_sets]
+
+    @staticmethod
+    def shared_facets(parent_active_set, active_set):
+        """
+        Returns the indices of the constraints that generate the facet shared by two neighboring critical regions if they differ for a single constraint (None otherwise: with multiple changes not all the changed constraints are facets of the child).
+        """
+        change = sorted(list(set(parent_active_set).symmetric_difference(set(active_set))))
+        if len(change) != 1:
+            return None
+        return change
+
+    @staticmethod
+    def adjacency_graph(critical_regions):
+        """
+        Returns the facet-to-neighbor graph of the explicit solution: the list neighbors such that neighbors[i][j] is the list of the indices of the critical regions found crossing the jth minimal facet of the ith critical region (empty CRs are not included, hence facets on the boundary of the feasible set have no neighbors).
+        """
+        indices = dict((tuple(cr.active_set), i) for i, cr in enumerate(critical_regions))
+        neighbors = []
+        for cr in critical_regions:
+            neighbors.append([
+                [indices[tuple(active_set)] for active_set in active_sets if tuple(active_set) in indices]
+                for active_sets in cr.neighbor_active_sets
+                ])
+
+        # make the graph symmetric: the child is connected to the parent through the facet opposite to the crossed one
+        for i, cr in enumerate(critical_regions):
+            for facet_index, facet_neighbors in enumerate(neighbors[i]):
+                facet = np.hstack((cr.polytope.lhs_min[facet_index,:], cr.polytope.rhs_min[facet_index,:]))
+                for j in facet_neighbors:
+                    facets_j = np.hstack((critical_regions[j].polytope.lhs_min, critical_regions[j].polytope.rhs_min))
+                    for opposite_facet_index in np.where(np.all(np.isclose(facets_j, -facet), axis=1))[0]:
+                        if i not in neighbors[j][opposite_facet_index]:
+                            neighbors[j][opposite_facet_index].append(i)
+        return neighbors
 
     def active_set_if_not_licq(self, candidate_active_set, facet_index, cr, dist=1e-6, lambda_bound=1e6, toll=1e-6):
         """
@@ -93,14 +347,20 @@ class MPQPSolver:
         active_set_change = list(set(cr.active_set).symmetric_difference(set(candidate_active_set)))
 
         # if there is more than one change, nothing can be done...
+        n_facet_lps = cr.polytope.n_facet_lps
         if len(active_set_change) > 1:
             print('Cannot solve degeneracy with multiple active set changes! The solution of a QP is required...')
+            self.count('degeneracies_multiple_changes')
             active_set = self.solve_qp_beyond_facet(facet_index, cr)
 
         # if there is one change solve the lp from Theorem 4
         else:
+            self.count('degeneracies_single_change')
             active_set = self.solve_lp_on_facet(candidate_active_set, facet_index, cr)
 
+        # Chebyshev centers of the facet (computed only once for each facet)
+        self.count('facet_chebyshev_lps', cr.polytope.n_facet_lps - n_facet_lps)
+
         return active_set
 
     def solve_qp_beyond_facet(self, facet_index, cr, dist=1e-8, toll=1.e-6):
@@ -129,12 +389,38 @@ class MPQPSolver:
         # solve the QP inside the new critical region to derive the active set
         x_beyond = x_center + dist*cr.polytope.lhs_min[facet_index,:].reshape(x_center.shape)
         x_beyond = x_beyond.reshape(x_center.shape[0],1)
-        z = quadratic_program(self.qp.H, np.zeros((self.qp.H.shape[0],1)), self.qp.G, self.qp.W + self.qp.S.dot(x_beyond))[0]
+        active_set = self.active_set_in(x_beyond, toll)
 
-        # new active set for the child
-        constraints_residuals = self.qp.G.dot(z) - self.qp.W - self.qp.S.dot(x_beyond)
-        active_set = [i for i in range(0,self.qp.G.shape[0]) if constraints_residuals[i] > -toll]
+        return active_set
 
+    def feasible_point_in(self, polytope):
+        """
+        Returns a parameter x inside the polytope for which the QP is feasible: the Chebyshev center of the set of the pairs (z, x) such that G z <= W + S x and x is in the polytope is computed (one LP), so that x is in the interior of the intersection of the polytope with the feasible set.
+        Raises a ValueError if this intersection is empty (or has no interior).
+        """
+        n_z = self.qp.G.shape[1]
+        lhs = np.vstack((
+            np.hstack((self.qp.G, -self.qp.S)),
+            np.hstack((np.zeros((polytope.A.shape[0], n_z)), polytope.A))
+            ))
+        rhs = np.vstack((self.qp.W, polytope.b))
+        center, radius = chebyshev_center(lhs, rhs)
+        self.count('chebyshev_lps')
+        if np.isnan(radius) or not np.all(np.isfinite(center)):
+            raise ValueError('The region of interest does not intersect the feasible set of the mpQP.')
+        return center[n_z:]
+
+    def active_set_in(self, x, toll=1.e-6):
+        """
+        Solves the QP for the parameter x and returns the indices of the constraints active at the optimum ([] if the QP is unfeasible).
+        """
+        x = np.reshape(x, (self.qp.S.shape[1], 1))
+        z = self.qp_solver.solve(np.zeros((self.qp.H.shape[0],1)), self.qp.W + self.qp.S.dot(x)).argmin
+        self.count('qps')
+        if any(np.isnan(z)):
+            return []
+        constraints_residuals = self.qp.G.dot(z) - self.qp.W - self.qp.S.dot(x)
+        active_set = [i for i in range(0,self.qp.G.shape[0]) if constraints_residuals[i] > -toll]
         return active_set
 
     def solve_lp_on_facet(self, candidate_active_set, facet_index, cr, toll=1e-6):
@@ -166,6 +452,7 @@ class MPQPSolver:
         cons_lhs = np.vstack((G_A.T, -G_A.T, -np.eye(n_lam)))
         cons_rhs = np.vstack((-self.qp.H.dot(z_center), self.qp.H.dot(z_center), np.zeros((n_lam,1))))
         sol = linear_program(cost, cons_lhs, cons_rhs)
+        self.count('degeneracy_lps')
 
         # if the solution in unbounded the region is unfeasible
         active_set = []
@@ -204,6 +491,25 @@ class MPQPSolver:
         return licq
 
 
+@contextmanager
+def _no_timer():
+    yield
+
+# the qp (and the region of interest) are shared with the worker processes when the pool is created (see MPQPSolver.compute_critical_regions)
+_worker_qp = None
+_worker_region_of_interest = None
+
+def _initialize_worker(qp, region_of_interest=None):
+    global _worker_qp, _worker_region_of_interest
+    _worker_qp = qp
+    _worker_region_of_interest = region_of_interest
+    return
+
+def _compute_critical_region(args):
+    active_set, parent_gram_factor, shared_facets = args
+    return CriticalRegion(active_set, _worker_qp, _worker_region_of_interest, parent_gram_factor, shared_facets)
+
+
 class CriticalRegion:
     """
     Implements the algorithm from Tondel et al. "An algorithm for multi-parametric quadratic programming and explicit MPC solutions"
@@ -223,9 +529,21 @@ class CriticalRegion:
         u_offset: offset term in the piecewise affine primal solution u_opt = u_linear*x + u_offset
         lambda_A_linear: linear term in the piecewise affine dual solution (only active multipliers) lambda_A = lambda_A_linear*x + lambda_A_offset
         lambda_A_offset: offset term in the piecewise affine dual solution (only active multipliers) lambda_A = lambda_A_linear*x + lambda_A_offset
+        times: dictionary with the time spent in the factorization of the Gram matrix and in the computation of the polytope
     """
 
-    def __init__(self, active_set, qp):
+    def __init__(self, active_set, qp, region_of_interest=None, parent_gram_factor=None, shared_facets=None):
+        """
+        If qp is None only the active set is stored, the other attributes are filled by upload_CriticalRegion().
+        If region_of_interest (Polytope) is provided, the critical region is intersected with it and no candidate active set is generated across its facets.
+        If parent_gram_factor (the attribute gram_factor of a neighboring critical region) is provided, the factorization of the Gram matrix of the active constraints is obtained updating it.
+        If shared_facets (indices of the constraints that generate the facet shared with the neighboring critical region) is provided, these facets are not checked for redundancy.
+        """
+
+        # critical region read from file
+        if qp is None:
+            self.active_set = active_set
+            return
 
         # store active set
         print 'Computing critical region for the active set ' + str(active_set)
@@ -233,8 +551,14 @@ class CriticalRegion:
         self.active_set = active_set
         self.inactive_set = sorted(list(set(range(self.n_constraints)) - set(active_set)))
 
-        # find the polytope
-        self.polytope(qp)
+        # factorize the Gram matrix of the active constraints and find the polytope (the time spent is stored in times)
+        self.times = dict()
+        tic = time.time()
+        self.factorize_gram_matrix(qp, parent_gram_factor)
+        self.times['gram_factorization'] = time.time() - tic
+        tic = time.time()
+        self.polytope(qp, region_of_interest, shared_facets)
+        self.times['polytope'] = time.time() - tic
         if self.polytope.empty:
             return
 
@@ -249,19 +573,56 @@ class CriticalRegion:
         if self.weakly_active_constraints:
             self.candidate_active_set = self.expand_candidate_active_sets(self.candidate_active_set, self.weakly_active_constraints)
 
+        # do not explore beyond the facets of the region of interest (their indices follow the ones of the constraints)
+        for i, coincident_facets in enumerate(minimal_coincident_facets):
+            if max(coincident_facets) >= self.n_constraints:
+                self.candidate_active_sets[i] = []
+
         return
 
-    def polytope(self, qp):
+    def factorize_gram_matrix(self, qp, parent_gram_factor=None):
         """
-        Stores a polytope that describes the critical region in the parameter space.
+        Stores the Cholesky factorization of the Gram matrix G_A H^-1 G_A' of the active constraints as gram_factor = [order, L], where order is the list of the active constraints in the order of the rows of L.
+        Neighboring active sets usually differ for one constraint, hence, if the factorization of the parent critical region is provided, it's updated with a rank-one downdate for each constraint that leaves the active set and a rank-one update for each constraint that enters it; the factorization is computed from scratch if the update fails numerically.
+        """
+
+        # update the factor of the parent
+        if parent_gram_factor is not None:
+            [order, L] = [list(parent_gram_factor[0]), parent_gram_factor[1]]
+            for i in [i for i in order if i not in self.active_set]:
+                L = cholesky_delete(L, order.index(i))
+                order.remove(i)
+            for i in [i for i in self.active_set if i not in order]:
+                g_i = qp.G_tilde[i:i+1,:]
+                L = cholesky_append(L, qp.G_tilde[order,:].dot(g_i.T), g_i.dot(g_i.T)[0,0])
+                if L is None:
+                    break
+                order.append(i)
+            if L is not None:
+                self.gram_factor = [order, L]
+                return
+
+        # factorize from scratch
+        G_tilde_A = qp.G_tilde[self.active_set,:]
+        self.gram_factor = [list(self.active_set), np.linalg.cholesky(G_tilde_A.dot(G_tilde_A.T))]
+        return
+
+    def polytope(self, qp, region_of_interest=None, shared_facets=None):
+        """
+        Stores a polytope that describes the critical region in the parameter space (intersected with the region of interest, if provided).
+        The rows of the polytope are as many as the constraints of the QP (many of them are redundant, or have zero norm): the shared facets are known to be non-redundant and the other ones are screened with a bounding box before solving the redundancy LPs with Clarkson's algorithm (see Polytope.find_minimal_facets()).
         """
 
         # multipliers explicit solution
         [G_A, W_A, S_A] = [qp.G[self.active_set,:], qp.W[self.active_set,:], qp.S[self.active_set,:]]
         [G_I, W_I, S_I] = [qp.G[self.inactive_set,:], qp.W[self.inactive_set,:], qp.S[self.inactive_set,:]]
-        H_A = np.linalg.inv(G_A.dot(qp.H_inv.dot(G_A.T)))
-        self.lambda_A_offset = - H_A.dot(W_A)
-        self.lambda_A_linear = - H_A.dot(S_A)
+        [order, L] = self.gram_factor
+        lambda_A = np.zeros((len(order), 1 + self.n_parameters))
+        if order:
+            lambda_A = - linalg.cho_solve((L, True), np.hstack((qp.W[order,:], qp.S[order,:])))
+        lambda_A = lambda_A[[order.index(i) for i in self.active_set],:]
+        self.lambda_A_offset = lambda_A[:,:1]
+        self.lambda_A_linear = lambda_A[:,1:]
 
         # primal variables explicit solution
         self.z_offset = - qp.H_inv.dot(G_A.T.dot(self.lambda_A_offset))
@@ -290,9 +651,14 @@ class CriticalRegion:
         lhs[self.inactive_set + self.active_set, :] = np.vstack((lhs_type_1, lhs_type_2))
         rhs[self.inactive_set + self.active_set] = np.vstack((rhs_type_1, rhs_type_2))
 
+        # intersect with the region of interest (its facets are appended after the ones generated by the constraints)
+        if region_of_interest is not None:
+            lhs = np.vstack((lhs, region_of_interest.A))
+            rhs = np.vstack((rhs, region_of_interest.b))
+
         # construct polytope
         self.polytope = Polytope(lhs, rhs)
-        self.polytope.assemble()
+        self.polytope.assemble(check_coincidences=True, check_redundancy=True, known_facets=shared_facets, screening=True, redundancy_method='clarkson')
 
         return
 
@@ -410,13 +776,244 @@ class CriticalRegion:
         Determines is a given point belongs to the critical region.
 
         INPUTS:
-            x: value of the parameter
+            x: value of the parameter (or matrix whose columns are values of the parameter)
 
         OUTPUTS:
-            is_inside: flag (True if x is in the CR, False otherwise)
+            is_inside: flag (True if x is in the CR, False otherwise), 1D array of flags if x has more than one column
         """
 
         # check if x is inside the polytope
         is_inside = self.polytope.applies_to(x)
 
         return is_inside
+
+    def save(self, group_name, super_group=None):
+        """
+        Saves the critical region (polytope, explicit solution and active sets of the neighbors) in the group_name.hdf5 file.
+        If a super group is provided, instead of saving the file, it adds the sub group gorup_name to the super group.
+        """
+
+        # open the file
+        if super_group is None:
+            group = h5py.File(group_name + '.hdf5', 'w')
+        else:
+            group = super_group.create_group(group_name)
+
+        # write polytope
+        group = self.polytope.save('polytope', group)
+
+        # write explicit solution
+        for name in ['lambda_A_offset', 'lambda_A_linear', 'z_offset', 'z_linear', 'u_offset', 'u_linear', 'V_quadratic', 'V_linear', 'V_offset']:
+            group.create_dataset(name, data=getattr(self, name))
+
+        # write the factorization of the Gram matrix
+        if hasattr(self, 'gram_factor'):
+            group.create_dataset('gram_factor_order', data=np.array(self.gram_factor[0], dtype=int))
+            group.create_dataset('gram_factor_L', data=self.gram_factor[1])
+
+        # write active sets
+        group.create_dataset('n_constraints', data=np.array([self.n_constraints]))
+        for name in ['active_set', 'candidate_active_sets', 'weakly_active_constraints', 'neighbor_active_sets']:
+            if hasattr(self, name):
+                group.create_dataset(name, data=np.string_(str(getattr(self, name))))
+
+        # close the file and return
+        if super_group is None:
+            group.close()
+            return
+        else:
+            return super_group
+
+
+def upload_CriticalRegion(group_name, super_group=None):
+    """
+    Reads the file group_name.hdf5 and generates a critical region from the data therein (see CriticalRegion.save()).
+    If a super_group is provided, reads the sub group named group_name which belongs to the super_group.
+    """
+
+    # open the file
+    if super_group is None:
+        critical_region = h5py.File(group_name + '.hdf5', 'r')
+    else:
+        critical_region = super_group[group_name]
+
+    # read active sets
+    cr = CriticalRegion(ast.literal_eval(str(critical_region['active_set'][()])), None)
+    for name in ['candidate_active_sets', 'weakly_active_constraints', 'neighbor_active_sets']:
+        if name in critical_region:
+            setattr(cr, name, ast.literal_eval(str(critical_region[name][()])))
+    cr.n_constraints = int(critical_region['n_constraints'][0])
+    cr.inactive_set = sorted(list(set(range(cr.n_constraints)) - set(cr.active_set)))
+
+    # read polytope and explicit solution
+    cr.polytope = upload_Polytope('polytope', critical_region)
+    cr.n_parameters = cr.polytope.A.shape[1]
+    for name in ['lambda_A_offset', 'lambda_A_linear', 'z_offset', 'z_linear', 'u_offset', 'u_linear', 'V_quadratic', 'V_linear', 'V_offset']:
+        setattr(cr, name, np.array(critical_region[name]))
+    if 'gram_factor_L' in critical_region:
+        cr.gram_factor = [[int(i) for i in critical_region['gram_factor_order']], np.array(critical_region['gram_factor_L'])]
+
+    # close the file and return
+    if super_group is None:
+        critical_region.close()
+    return cr
+
+
+class CriticalRegionCache:
+    """
+    Cache of critical regions on disk: each critical region is saved (see CriticalRegion.save()) in a file of the directory directory_name named after the fingerprint of the mpQP and the active set.
+    When the size of the directory exceeds max_size (bytes) the least recently used files are deleted.
+
+    VARIABLES:
+        directory_name: directory of the cache
+        max_size: maximum size of the directory (bytes)
+        size: current size of the directory (bytes)
+    """
+
+    def __init__(self, directory_name, max_size=1.e9):
+        self.directory_name = directory_name
+        self.max_size = max_size
+        if not os.path.isdir(directory_name):
+            os.makedirs(directory_name)
+        self.size = sum(os.path.getsize(file_name) for file_name in self.files())
+        if self.size > self.max_size:
+            self.evict()
+        return
+
+    @staticmethod
+    def fingerprint(qp, region_of_interest=None):
+        """
+        Returns a hash of the matrices H, G, W and S of the mpQP (and of the region of interest, if provided).
+        """
+        matrices = [qp.H, qp.G, qp.W, qp.S]
+        if region_of_interest is not None:
+            matrices += [region_of_interest.A, region_of_interest.b]
+        fingerprint = hashlib.sha1()
+        for M in matrices:
+            fingerprint.update(str(M.shape))
+            fingerprint.update(np.ascontiguousarray(M, dtype=float).tostring())
+        return fingerprint.hexdigest()
+
+    def group_name(self, fingerprint, active_set):
+        return os.path.join(self.directory_name, fingerprint + '_' + hashlib.sha1(str(sorted(active_set))).hexdigest())
+
+    def files(self):
+        return [os.path.join(self.directory_name, f) for f in os.listdir(self.directory_name) if f.endswith('.hdf5')]
+
+    def get(self, fingerprint, active_set):
+        """
+        Returns the critical region of the given active set (None if it is not in the cache).
+        """
+        group_name = self.group_name(fingerprint, active_set)
+        if not os.path.isfile(group_name + '.hdf5'):
+            return None
+        try:
+            cr = upload_CriticalRegion(group_name)
+        except (IOError, KeyError):
+            print('Corrupted file ' + group_name + '.hdf5 removed from the cache.')
+            self.remove(group_name + '.hdf5')
+            return None
+        os.utime(group_name + '.hdf5', None)
+        return cr
+
+    def put(self, fingerprint, cr):
+        """
+        Adds a critical region to the cache (the file is written under a temporary name and then renamed, so that other processes never read an incomplete file).
+        """
+        group_name = self.group_name(fingerprint, cr.active_set)
+        cr.save(group_name + '.tmp')
+        os.rename(group_name + '.tmp.hdf5', group_name + '.hdf5')
+        self.size += os.path.getsize(group_name + '.hdf5')
+        if self.size > self.max_size:
+            self.evict()
+        return
+
+    def evict(self):
+        """
+        Deletes the least recently used files until the size of the cache is below 90% of max_size.
+        """
+        file_names = sorted(self.files(), key=os.path.getmtime)
+        self.size = sum(os.path.getsize(file_name) for file_name in file_names)
+        while file_names and self.size > .9*self.max_size:
+            self.remove(file_names.pop(0))
+        return
+
+    def remove(self, file_name):
+        self.size -= os.path.getsize(file_name)
+        os.remove(file_name)
+        return
+
+
+class MergedCriticalRegion:
+    """
+    Convex union of critical regions that share the same first input u_0 = u_linear*x + u_offset.
+
+    VARIABLES:
+        polytope: polytope describing the union of the critical regions in the parameter space
+        u_linear: linear term of the first input
+        u_offset: offset term of the first input
+        critical_regions: list of the merged critical regions
+    """
+
+    def __init__(self, polytope, u_linear, u_offset, critical_regions):
+        self.polytope = polytope
+        self.u_linear = u_linear
+        self.u_offset = u_offset
+        self.critical_regions = critical_regions
+        return
+
+    def u_optimal(self, x):
+        """
+        Returns the first input as a function of the parameter.
+        """
+        return self.u_offset + self.u_linear.dot(x)
+
+    def applies_to(self, x):
+        """
+        Determines is a given point belongs to the region (see Polytope.applies_to() for a matrix of points).
+        """
+        return self.polytope.applies_to(x)
+
+
+def merge_critical_regions(critical_regions, n_u):
+    """
+    Groups the critical regions with the same first input (the first n_u rows of u_linear and u_offset) and, within each group, greedily merges pairs of regions whose union is convex (see Polytope.union_if_convex()) until no pair can be merged.
+
+    INPUTS:
+        critical_regions: list (or NDPiecewise) of critical regions
+        n_u: number of inputs
+
+    OUTPUTS:
+        merged_regions: NDPiecewise of MergedCriticalRegion
+    """
+
+    # group critical regions with the same first input
+    families = []
+    for cr in critical_regions:
+        for family in families:
+            if np.allclose(cr.u_linear[:n_u,:], family[0].u_linear[:n_u,:]) and np.allclose(cr.u_offset[:n_u,:], family[0].u_offset[:n_u,:]):
+                family.append(cr)
+                break
+        else:
+            families.append([cr])
+
+    # merge the regions of each family
+    merged_regions = []
+    for family in families:
+        regions = [MergedCriticalRegion(cr.polytope, cr.u_linear[:n_u,:], cr.u_offset[:n_u,:], [cr]) for cr in family]
+        i = 0
+        while i < len(regions):
+            j = i + 1
+            while j < len(regions):
+                union = regions[i].polytope.union_if_convex(regions[j].polytope)
+                if union is None:
+                    j += 1
+                else:
+                    regions[i] = MergedCriticalRegion(union, regions[i].u_linear, regions[i].u_offset, regions[i].critical_regions + regions[j].critical_regions)
+                    del regions[j]
+                    j = i + 1
+            i += 1
+        merged_regions += regions
+
+    print(str(len(critical_regions)) + ' critical regions merged in ' + str(len(merged_regions)) + ' regions (' + str(len(families)) + ' different first inputs).')
+    return NDPiecewise(merged_regions)
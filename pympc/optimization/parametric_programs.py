@@ -1,5 +1,7 @@
 import numpy as np
-from pympc.optimization.gurobi import linear_program, quadratic_program, linear_expression, quadratic_expression
+from pympc.optimization.backends import linear_program
+from pympc.optimization.gurobi import quadratic_program, linear_expression, quadratic_expression, add_linear_constraints
+from pympc.optimization.dual_active_set import quadratic_program as dual_active_set_qp
 from pympc.geometry.polytope import Polytope
 import gurobipy as grb
 
@@ -76,11 +78,26 @@ class ParametricQP:
         self.C_u = C_u
         self.C_x = C_x
         self.C = C
-        self.model, self.quadratic_cost = self.build_model()
+        self._model = None
         self.remove_linear_terms()
         self._feasible_set = None
         return
 
+    @property
+    def model(self):
+        """
+        Gurobi model of the QP (built on first access, so that the explicit solution and the dual active-set solver can be used without Gurobi).
+        """
+        if self._model is None:
+            self._model, self._quadratic_cost = self.build_model()
+        return self._model
+
+    @property
+    def quadratic_cost(self):
+        if self._model is None:
+            self._model, self._quadratic_cost = self.build_model()
+        return self._quadratic_cost
+
     def build_model(self):
 
         H = np.vstack((
@@ -95,10 +112,10 @@ class ParametricQP:
         model = grb.Model()
         n = H.shape[0]
         ux = model.addVars(n, lb=[- grb.GRB.INFINITY]*n)
+        ux = [ux[i] for i in range(n)]
 
         # linear inequalities
-        for i, expr in enumerate(linear_expression(A, b, ux)):
-            model.addConstr(expr <= 0., name='ineq_'+str(i))
+        add_linear_constraints(model, A, ux, grb.GRB.LESS_EQUAL, b, 'ineq_')
 
         # cost function
         quadratic_cost = grb.QuadExpr()
@@ -134,6 +151,25 @@ class ParametricQP:
             argmin = np.full((n_u,1), np.nan)
         return argmin, cost
 
+    def solve_dual_active_set(self, x, active_set=None):
+        """
+        Solves the QP for the parameter x with the dual active-set solver (see optimization.dual_active_set) in the variables z of remove_linear_terms(), without building any Gurobi model.
+        The active_set (e.g. the one of the previous time step in receding-horizon control) is used to warm start the solver.
+
+        OUTPUTS:
+            u_star: optimal value of u (=nan if the QP is unfeasible)
+            cost: optimal value of the cost function (=nan if the QP is unfeasible)
+            active_set: active set at the optimum (None if the QP is unfeasible)
+        """
+        n_u = self.F_uu.shape[0]
+        x = np.reshape(x, (self.F_xx.shape[0], 1))
+        sol = dual_active_set_qp(self.H_inv, np.zeros((n_u,1)), self.G, self.W + self.S.dot(x), active_set)
+        if sol.active_set is None:
+            return np.full((n_u,1), np.nan), np.nan, None
+        u_star = sol.argmin - self.H_inv.dot(self.F_xu.T.dot(x) + self.F_u)
+        cost = sol.min + (.5*x.T.dot(self.F_xx_q).dot(x) + self.F_x_q.T.dot(x) + self.F_q)[0,0]
+        return u_star, cost, sol.active_set
+
     def set_initial_state(self, x):
         n_u = self.F_uu.shape[0]
         n_x = self.F_xx.shape[0]
@@ -155,6 +191,7 @@ class ParametricQP:
         V = 1/2 z' H z + 1/2 x' F_xx_q x + F_x_q' x + F_q
         and the constraints in the form:
         G u <= W + S x
+        It also stores G_tilde = G H^-1/2, so that the Gram matrix of a set of constraints G_A H^-1 G_A' is G_tilde_A G_tilde_A'.
         """
         self.H_inv = np.linalg.inv(self.F_uu)
         self.H = self.F_uu
@@ -164,6 +201,7 @@ class ParametricQP:
         self.G = self.C_u
         self.S = self.C_x + self.C_u.dot(self.H_inv).dot(self.F_xu.T)
         self.W = self.C + self.C_u.dot(self.H_inv).dot(self.F_u)
+        self.G_tilde = self.G.dot(np.linalg.cholesky(self.H_inv))
         return
 
     def save(self, group_name, super_group=None):
@@ -211,7 +249,7 @@ class ParametricQP:
     def feasible_set(self):
         if self._feasible_set is None:
             augmented_polytope = Polytope(np.hstack((- self.C_x, self.C_u)), self.C)
-            augmented_polytope.assemble()
+            augmented_polytope.assemble(redundancy_method='clarkson')
             if augmented_polytope.empty:
                 return None
             self._feasible_set = augmented_polytope.orthogonal_projection(range(self.C_x.shape[1]))
@@ -1,5 +1,6 @@
 from scipy.optimize import nnls
 import numpy as np
+import scipy.linalg as linalg
 from collections import namedtuple
 import scipy.io
 import time
@@ -124,54 +125,170 @@ def linear_program(f, A=None, b=None, C=None, d=None, tol=1.e-7):
 
     # sometimes the nnls algorithms excedes the maximum number of iterations...
     except RuntimeError:
-        # print('Too many iterations in PNNLS LP solver, switched to gurobi.')
-        from gurobi import linear_program as lp_gurobi
-        sol = lp_gurobi(f, A, b, C, d)
+        # print('Too many iterations in PNNLS LP solver, switched to another backend.')
+        from backends import linear_program as lp_fallback
+        sol = lp_fallback(f, A[:n_ineq,:], b[:n_ineq,:], C, d, backend='auto', exclude=['pnnls'])
 
     return sol
 
+def linear_program_batch(F, A, b, tol=1.e-7):
+    """
+    Solves the linear programs
+    min  F[:,i]^T x
+    s.t. A x <= b[:,i]
+    for a stack of cost vectors F (n_x x n_lps) and/or right-hand sides b (n_ineq x n_lps), a single column of F or b is used for all the LPs.
+    With the notation of linear_program(), the PNNLS matrix B = [f'; A; 0] changes only in the first row, hence the pseudoinverse of B is obtained from (A' A)^-1 (computed once) with the Sherman-Morrison formula and the projection onto the nullspace of B' is applied without building the projector.
+
+    OUTPUTS:
+        sols: list of LPSolution (see linear_program())
+    """
+
+    # number of LPs
+    [n_ineq, n_x] = A.shape
+    n_lps = max(F.shape[1], b.shape[1])
+    F_i = lambda i: F[:, i%F.shape[1]:i%F.shape[1]+1]
+    b_i = lambda i: b[:, i%b.shape[1]:i%b.shape[1]+1]
+
+    # if A' A is singular there is nothing to factor
+    if n_ineq == 0 or np.linalg.matrix_rank(A) < n_x:
+        return [linear_program(F_i(i), A, b_i(i), tol=tol) for i in range(n_lps)]
+    A_pinv = np.linalg.pinv(A)
+    M_inv = A_pinv.dot(A_pinv.T)
+
+    # constant part of the PNNLS matrices
+    A_pnnls = np.vstack((
+        np.zeros((1, 2*n_ineq)),
+        np.hstack((np.zeros((n_ineq, n_ineq)), np.eye(n_ineq))),
+        np.hstack((A.T, np.zeros((n_x, n_ineq))))
+        ))
+
+    sols = []
+    for i in range(n_lps):
+        f = F_i(i)
+        b_lp = b_i(i)
+
+        # PNNLS matrices of the ith LP
+        A_pnnls[0,:n_ineq] = b_lp.flatten()
+        B_pnnls = np.vstack((f.T, A, np.zeros((n_x, n_x))))
+        c_pnnls = np.vstack((0., b_lp, -f))
+
+        # (B' B)^-1 = (A' A + f f')^-1, B' A_pnnls = [f b', A'] and B' c = A' b
+        M_inv_f = M_inv.dot(f)
+        BB_inv = M_inv - M_inv_f.dot(M_inv_f.T)/(1. + f.T.dot(M_inv_f)[0,0])
+        BA = np.hstack((f.dot(b_lp.T), A.T))
+        Bc = A.T.dot(b_lp)
+        A_bar = A_pnnls - B_pnnls.dot(BB_inv.dot(BA))
+        b_bar = c_pnnls - B_pnnls.dot(BB_inv.dot(Bc))
+
+        # solve nnls (if the maximum number of iterations is exceeded, solve the LP alone)
+        try:
+            [ys_star, r_star] = nnls(A_bar, b_bar.flatten())
+        except RuntimeError:
+            sols.append(linear_program(f, A, b_lp, tol=tol))
+            continue
+        ys_star = np.reshape(ys_star, (2*n_ineq, 1))
+        x_star = - BB_inv.dot(BA.dot(ys_star) - Bc)
+
+        # populate output
+        argmin = np.full((n_x,1), np.nan)
+        V_star = np.nan
+        active_set = None
+        mult_ineq = np.full((n_ineq,1), np.nan)
+        primal_degenerate = None
+        dual_degenerate = None
+        if r_star < tol:
+            argmin = x_star
+            V_star = (f.T.dot(x_star))[0,0]
+            mult_ineq = ys_star[:n_ineq,:]
+            residuals_ineq = ys_star[n_ineq:,:]
+            active_set = sorted(list(np.where(residuals_ineq < tol)[0]))
+            primal_degenerate = len(active_set) > n_x
+            dual_degenerate = len(list(np.where(mult_ineq < tol)[0])) > n_ineq - n_x
+        sols.append(LPSolution(
+            argmin = argmin,
+            min = V_star,
+            active_set = active_set,
+            inequality_multipliers = mult_ineq,
+            equality_multipliers = np.full((0,1), np.nan),
+            primal_degenerate = primal_degenerate,
+            dual_degenerate = dual_degenerate))
+
+    return sols
+
+class QuadraticProgram:
+    """
+    Strictly convex (H > 0) quadratic program
+    min  .5 x^T H x + f^T x
+    s.t. A x <= b
+    with fixed H and A: the factorizations needed by the PNNLS solver are computed once in the constructor, so that each call to solve(f, b) costs a single NNLS plus matrix-vector products (e.g. QPs solved for different values of the parameter of a mp-QP).
+
+    VARIABLES:
+        H: Hessian of the cost function
+        A: left-hand side of the constraints
+        L: lower triangular Cholesky factor of H (H = L L^T)
+        M_T: transpose of A L^-T (= L^-1 A^T)
+        H_inv_A_T: H^-1 A^T
+    """
+
+    def __init__(self, H, A):
+        self.H = H
+        self.A = A
+        self.L = np.linalg.cholesky(H)
+        self.M_T = linalg.solve_triangular(self.L, A.T, lower=True)
+        self.H_inv_A_T = linalg.solve_triangular(self.L.T, self.M_T, lower=False)
+        return
+
+    def solve(self, f, b, tol=1.e-7):
+        """
+        Solves the QP for the linear term of the cost f and the right-hand side of the constraints b.
+
+        OUTPUTS:
+            x_star: argument which minimizes the cost (=nan if the QP is unfeasible)
+            V_star: minimum of the cost function (=nan if the QP is unfeasible)
+        """
+
+        try:
+            n_x = self.H.shape[1]
+            f = np.reshape(f, (n_x,1))
+            H_inv_f = linalg.cho_solve((self.L, True), f)
+            d = b + self.A.dot(H_inv_f)
+            gamma = 1
+            lhs_nnls = np.vstack((-self.M_T,-d.T))
+            rhs_nnls = np.vstack((np.zeros((n_x,1)),gamma)).flatten()
+            [y_star, rvalue_star] = nnls(lhs_nnls, rhs_nnls)
+            y_star = np.reshape(y_star,(len(y_star),1))
+            r_star = lhs_nnls.dot(y_star)-np.vstack((np.zeros((n_x,1)),gamma))
+            if (np.linalg.norm(r_star)<tol):
+                x_star = np.full((n_x,1), np.nan)
+                V_star = np.nan
+            else:
+                x_star = -H_inv_f - self.H_inv_A_T.dot(y_star)/(gamma+d.T.dot(y_star))
+                V_star = (0.5 * x_star.T.dot(self.H).dot(x_star) + f.T.dot(x_star))[0,0]
+            sol = QPSolution(
+                argmin = x_star,
+                min = V_star)
+
+        except RuntimeError:
+            # print('Too many iterations in PNNLS QP solver, switched to another backend.')
+            from backends import quadratic_program as qp_fallback
+            sol = qp_fallback(self.H, f, self.A, b, backend='auto', exclude=['pnnls'])
+
+        return sol
+
 def quadratic_program(H, f=None, A=None, b=None, C=None, d=None, tol=1.e-7):
     """
     Solves the strictly convex (H > 0) quadratic program
     min  .5 x^T H x + f^T x
     s.t. A x <= b
          C x  = d
+    (to solve many QPs with the same H and A see QuadraticProgram).
 
     OUTPUTS:
         x_star: argument which minimizes the cost (=nan if the LP is unfeasible or unbounded)
         V_star: minimum of the cost function (=nan if the LP is unfeasible or unbounded)
     """
 
-    try:
-        if((C is not None) and (d is not None)):
-            A = np.vstack((A,C,-C))
-            b = np.vstack((b,d,-d))
-        n_x = H.shape[1]
-        L = np.linalg.cholesky(H)
-        L = L.T
-        M = A.dot(np.linalg.inv(L))
-        f = np.reshape(f, (n_x,1))
-        d = b + A.dot(np.linalg.inv(H)).dot(f)
-        gamma = 1
-        lhs_nnls = np.vstack((-M.T,-d.T))
-        rhs_nnls = np.vstack((np.zeros((n_x,1)),gamma)).flatten()
-        # scipy.io.savemat('nnls_matrices_' + str(time.time()), {'A': lhs_nnls, 'b': rhs_nnls})
-        [y_star, rvalue_star] = nnls(lhs_nnls, rhs_nnls)
-        y_star = np.reshape(y_star,(len(y_star),1))
-        r_star = np.vstack((-M.T,-d.T)).dot(y_star)-np.vstack((np.zeros((n_x,1)),gamma))
-        if (np.linalg.norm(r_star)<tol):
-            x_star = np.full((n_x,1), np.nan)
-            V_star = np.nan
-        else:
-            x_star = -np.linalg.inv(H).dot(f+A.T.dot(y_star)/(gamma+d.T.dot(y_star)))
-            V_star = (0.5 * x_star.T.dot(H).dot(x_star) + f.T.dot(x_star))[0,0]
-        sol = QPSolution(
-            argmin = x_star,
-            min = V_star)
-
-    except RuntimeError:
-        # print('Too many iterations in PNNLS LP solver, switched to gurobi.')
-        from gurobi import quadratic_program as qp_gurobi
-        sol = qp_gurobi(H, f, A, b, C, d)
-
-    return sol
+    if((C is not None) and (d is not None)):
+        A = np.vstack((A,C,-C))
+        b = np.vstack((b,d,-d))
+    return QuadraticProgram(H, A).solve(f, b, tol)
@@ -0,0 +1,78 @@
+import numpy as np
+import scipy
+from distutils.version import LooseVersion
+from scipy.optimize import linprog
+from pnnls import LPSolution, pnnls
+
+# HiGHS is available from SciPy 1.6
+METHOD = 'highs' if LooseVersion(scipy.__version__) >= LooseVersion('1.6') else 'interior-point'
+
+def linear_program(f, A=None, b=None, C=None, d=None, tol=1.e-7):
+    """
+    Solves the linear program
+    min  f^T x
+    s.t. A x <= b
+         C x  = d
+    with scipy.optimize.linprog (HiGHS if the installed version of SciPy provides it, the interior-point method otherwise).
+    If the solver does not return the Lagrange multipliers, they are recovered from the KKT conditions of the active constraints.
+
+    OUTPUTS:
+        x_star: argument which minimizes the cost (=nan if the LP is unfeasible or unbounded)
+        V_star: minimum of the cost function (=nan if the LP is unfeasible or unbounded)
+    """
+
+    # problem dimensions
+    n_x = f.shape[0]
+    f = np.reshape(f, (n_x,1))
+    if A is None or b is None:
+        A = np.zeros((0, n_x))
+        b = np.zeros((0, 1))
+    n_ineq = A.shape[0]
+    n_eq = 0
+    if C is not None and d is not None:
+        n_eq = C.shape[0]
+
+    # initialize output
+    argmin = np.full((n_x,1), np.nan)
+    V_star = np.nan
+    active_set = None
+    mult_ineq = np.full((n_ineq,1), np.nan)
+    mult_eq = np.full((n_eq,1), np.nan)
+
+    # solve the lp
+    res = linprog(
+        f.flatten(),
+        A_ub = A if n_ineq > 0 else None,
+        b_ub = b.flatten() if n_ineq > 0 else None,
+        A_eq = C if n_eq > 0 else None,
+        b_eq = d.flatten() if n_eq > 0 else None,
+        bounds = (None, None),
+        method = METHOD)
+
+    # populate output
+    if res.status == 0:
+        argmin = np.reshape(res.x, (n_x,1))
+        V_star = f.T.dot(argmin)[0,0]
+        active_set = sorted(list(np.where(A.dot(argmin) - b > -tol)[0]))
+        if hasattr(res, 'ineqlin') and hasattr(res.ineqlin, 'marginals'):
+            mult_ineq = - np.reshape(res.ineqlin.marginals, (n_ineq,1))
+            if n_eq > 0:
+                mult_eq = - np.reshape(res.eqlin.marginals, (n_eq,1))
+        else:
+            mult_ineq = np.zeros((n_ineq,1))
+            mult_eq = np.zeros((n_eq,1))
+            if active_set:
+                C_eq = C if n_eq > 0 else np.zeros((0, n_x))
+                mult_active, mult_eq, r = pnnls(A[active_set,:].T, C_eq.T, - f)
+                mult_ineq[active_set,:] = mult_active
+            elif n_eq > 0:
+                mult_eq = np.linalg.lstsq(C.T, - f, rcond=None)[0]
+
+    return LPSolution(
+        argmin = argmin,
+        min = V_star,
+        active_set = active_set,
+        inequality_multipliers = mult_ineq,
+        equality_multipliers = mult_eq,
+        primal_degenerate = None,
+        dual_degenerate = None)
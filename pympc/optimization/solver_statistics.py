@@ -0,0 +1,98 @@
+import time
+import json
+from contextlib import contextmanager
+
+class SolverStatistics:
+    """
+    Timings and counters collected during the solution of a multiparametric program (see MPQPSolver).
+
+    VARIABLES:
+        times: dictionary phase -> total wall time spent in the phase (s)
+        counters: dictionary event -> number of occurrences (LPs and QPs solved, regions, degeneracies, ...)
+        frontier: list of [elapsed time, number of critical regions to be explored, number of explored critical regions], one entry for each layer of the exploration
+    """
+
+    def __init__(self):
+        self.times = dict()
+        self.counters = dict()
+        self.frontier = []
+        self.tic = time.time()
+        return
+
+    @contextmanager
+    def timer(self, phase):
+        """
+        Adds the time spent in the with-block to the given phase.
+        """
+        tic = time.time()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.time() - tic)
+
+    def add_time(self, phase, t):
+        self.times[phase] = self.times.get(phase, 0.) + t
+        return
+
+    def count(self, event, n=1):
+        self.counters[event] = self.counters.get(event, 0) + n
+        return
+
+    def record_frontier(self, n_to_be_explored, n_explored):
+        self.frontier.append([time.time() - self.tic, n_to_be_explored, n_explored])
+        return
+
+    def add_critical_region(self, cr):
+        """
+        Collects the timings of the computation of a critical region (possibly computed by a worker process) and the number of LPs solved for its polytope (counted by the polytope where they are solved, see Polytope).
+        """
+        self.count('critical_regions_computed')
+        for phase, t in getattr(cr, 'times', dict()).items():
+            self.add_time('critical_region/' + phase, t)
+        for step, t in getattr(cr.polytope, 'assembly_times', dict()).items():
+            self.add_time('critical_region/polytope_' + step, t)
+        self.count('chebyshev_lps', cr.polytope.n_chebyshev_lps)
+        self.count('boundedness_lps', cr.polytope.n_boundedness_lps)
+        self.count('redundancy_lps', getattr(cr.polytope, 'n_redundancy_lps', 0))
+        if cr.polytope.empty:
+            self.count('empty_critical_regions')
+            return
+        self.count('weakly_active_constraints', len(cr.weakly_active_constraints))
+        return
+
+    def to_dict(self):
+        return {
+            'times': self.times,
+            'counters': self.counters,
+            'frontier': self.frontier
+            }
+
+    def save(self, file_name):
+        """
+        Writes the statistics in the JSON file file_name.
+        """
+        with open(file_name, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4, sort_keys=True)
+        return
+
+    def __str__(self):
+        lines = ['Phase' + ' '*35 + 'Time (s)']
+        for phase in sorted(self.times, key=self.times.get, reverse=True):
+            lines.append(phase.ljust(40) + '%.4f' % self.times[phase])
+        lines.append('\nEvent' + ' '*35 + 'Count')
+        for event in sorted(self.counters):
+            lines.append(event.ljust(40) + str(self.counters[event]))
+        return '\n'.join(lines)
+
+
+def upload_SolverStatistics(file_name):
+    """
+    Reads the JSON file file_name (see SolverStatistics.save()).
+    """
+    with open(file_name, 'r') as f:
+        data = json.load(f)
+    statistics = SolverStatistics()
+    statistics.times = data['times']
+    statistics.counters = data['counters']
+    statistics.frontier = data['frontier']
+    return statistics
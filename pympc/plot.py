@@ -173,6 +173,7 @@ def state_space_trajectory(x_trajectory, state_components=[0,1], **kwargs):
 
 
 from pympc.geometry.polytope import Polytope
+from pympc.explicit_solution import ExplicitSolution
 def state_partition(critical_regions, feasible_set, active_set=False, facet_index=False, **kwargs):
     if critical_regions is None:
         raise ValueError('Explicit solution not computed yet! First run .compute_explicit_solution().')
@@ -228,7 +229,8 @@ def optimal_value_function(critical_regions):
     x = np.arange(x_min, x_max, (x_max-x_min)/100.)
     y = np.arange(y_min, y_max, (y_max-y_min)/100.)
     X, Y = np.meshgrid(x, y)
-    zs = np.array([evaluate_optimal_value_function(critical_regions, np.array([[x],[y]])) for x,y in zip(np.ravel(X), np.ravel(Y))])
+    explicit_solution = ExplicitSolution.from_critical_regions(critical_regions)
+    zs = explicit_solution.evaluate(np.vstack((np.ravel(X), np.ravel(Y))).T)[3]
     Z = zs.reshape(X.shape)
     cp = plt.contour(X, Y, Z)
     plt.colorbar(cp)
@@ -1,9 +1,80 @@
 import unittest
+import os
+import tempfile
+import shutil
+import multiprocessing
 import numpy as np
 import pympc.dynamical_systems as ds
-from pympc.optimization.mpqpsolver import CriticalRegion
+from pympc.optimization.parametric_programs import ParametricQP
+from pympc.optimization.mpqpsolver import MPQPSolver, CriticalRegion, CriticalRegionCache
+from pympc.optimization.solver_statistics import upload_SolverStatistics
 from pympc.geometry.polytope import Polytope
 from pympc.control import ModelPredictiveController, HybridModelPredictiveController
+from pympc.explicit_solution import upload_ExplicitSolution
+from pympc.explicit_controller import ExplicitController
+
+
+def double_integrator_controller(objective_norm='two'):
+    """
+    MPC controller of the double integrator (the Gurobi model of the condensed program is never built, hence its explicit solution does not require Gurobi).
+    For objective_norm = 'two' the terminal cost and set are the ones of the LQR, for objective_norm = 'one' they are the stage cost and the state constraints.
+    """
+
+    # double integrator
+    A = np.array([[0., 1.],[0., 0.]])
+    B = np.array([[0.],[1.]])
+    t_s = 1.
+    sys = ds.LinearSystem.from_continuous(A, B, t_s)
+
+    # mpc controller
+    N = 5
+    Q = np.eye(A.shape[0])
+    R = np.eye(B.shape[1])
+    P, K = ds.dare(sys.A, sys.B, Q, R)
+    u_max = np.array([[1.]])
+    u_min = -u_max
+    U = Polytope.from_bounds(u_min, u_max)
+    U.assemble()
+    x_max = np.array([[1.], [1.]])
+    x_min = -x_max
+    X = Polytope.from_bounds(x_min, x_max)
+    X.assemble()
+    if objective_norm == 'one':
+        P = Q
+        X_N = X
+    else:
+        X_N = ds.moas_closed_loop_from_orthogonal_domains(sys.A, sys.B, K, X, U)
+    controller = ModelPredictiveController(sys, N, objective_norm, Q, R, P, X, U, X_N)
+
+    return sys, controller
+
+
+def small_mpqp(parameter_bound=2.):
+    """
+    Fixed mp-QP with 3 variables and 2 parameters: bounds on the variables, two constraints coupling variables and parameters and bounds on the parameters (|x_i| <= parameter_bound).
+    """
+
+    # cost function
+    F_uu = np.array([[2.,.5,0.],[.5,2.,.5],[0.,.5,2.]])
+    F_xu = np.array([[1.,0.,.5],[0.,1.,-.5]])
+    F_xx = np.eye(2)
+    F_u = np.array([[.1],[0.],[-.1]])
+    F_x = np.zeros((2,1))
+    F = np.zeros((1,1))
+
+    # constraints
+    C_u = np.vstack((np.eye(3), -np.eye(3), np.array([[1.,1.,0.],[0.,-1.,1.]]), np.zeros((4,3))))
+    C_x = np.vstack((np.zeros((6,2)), np.eye(2), -np.eye(2), np.eye(2)))
+    C = np.vstack((np.ones((6,1)), .5*np.ones((2,1)), parameter_bound*np.ones((4,1))))
+
+    return ParametricQP(F_uu, F_xu, F_xx, F_u, F_x, F, C_u, C_x, C)
+
+
+def active_set_graph(critical_regions):
+    """
+    Adjacency graph of an explicit solution in terms of active sets (independent of the order of the critical regions): for each active set, the list of the sorted active sets found across each minimal facet.
+    """
+    return dict((tuple(cr.active_set), [sorted(critical_regions.elements[j].active_set for j in facet_neighbors) for facet_neighbors in critical_regions.neighbors[i]]) for i, cr in enumerate(critical_regions))
 
 
 class TestMPCTools(unittest.TestCase):
@@ -31,29 +102,7 @@ class TestMPCTools(unittest.TestCase):
 
     def test_ModelPredictiveController(self):
         np.random.seed(1)
-
-        # double integrator
-        A = np.array([[0., 1.],[0., 0.]])
-        B = np.array([[0.],[1.]])
-        t_s = 1.
-        sys = ds.LinearSystem.from_continuous(A, B, t_s)
-
-        # mpc controller
-        N = 5
-        Q = np.eye(A.shape[0])
-        R = np.eye(B.shape[1])
-        objective_norm = 'two'
-        P, K = ds.dare(sys.A, sys.B, Q, R)
-        u_max = np.array([[1.]])
-        u_min = -u_max
-        U = Polytope.from_bounds(u_min, u_max)
-        U.assemble()
-        x_max = np.array([[1.], [1.]])
-        x_min = -x_max
-        X = Polytope.from_bounds(x_min, x_max)
-        X.assemble()
-        X_N = ds.moas_closed_loop_from_orthogonal_domains(sys.A, sys.B, K, X, U)
-        controller = ModelPredictiveController(sys, N, objective_norm, Q, R, P, X, U, X_N)
+        sys, controller = double_integrator_controller()
 
         # explicit vs implicit solution
         controller.get_explicit_solution()
@@ -75,6 +124,295 @@ class TestMPCTools(unittest.TestCase):
                 self.assertTrue(np.isclose(V_explicit, V_implicit, rtol=1.e-4))
                 # self.assertTrue(controller.condensed_program.feasible_set.applies_to(x0))
 
+    def test_search_tree(self):
+        np.random.seed(1)
+        sys, controller = double_integrator_controller()
+        controller.get_explicit_solution(search_tree=True)
+        critical_regions = controller.critical_regions
+        self.assertTrue(critical_regions.search_tree is not None)
+
+        # regions that only touch a hyperplane are not stored on both sides: the tree separates all the regions
+        leaves = [critical_regions.search_tree]
+        while any(node.elements is None for node in leaves):
+            leaves = [child for node in leaves for child in ([node] if node.elements is not None else node.children)]
+        self.assertEqual(max(len(node.elements) for node in leaves), 1)
+        self.assertTrue(critical_regions.search_tree.depth < len(critical_regions))
+
+        # search tree vs linear scan
+        for i in range(100):
+            x0 = 2.*np.random.rand(2,1) - 1.
+            cr_tree = critical_regions.lookup(x0)
+            critical_regions.search_tree, tree = None, critical_regions.search_tree
+            cr_scan = critical_regions.lookup(x0)
+            critical_regions.search_tree = tree
+            if cr_scan is None:
+                self.assertTrue(cr_tree is None)
+            else:
+                self.assertTrue(cr_tree is not None)
+                self.assertTrue(np.allclose(cr_tree.u_offset + cr_tree.u_linear.dot(x0), cr_scan.u_offset + cr_scan.u_linear.dot(x0)))
+
+    def test_batch_evaluation(self):
+        np.random.seed(1)
+        sys, controller = double_integrator_controller()
+        controller.get_explicit_solution()
+        n_test = 100
+
+        # batch evaluation vs single evaluations
+        x0s = np.random.rand(n_test, 2)
+        indices, u_first, u_batch, V_batch = controller.feedforward_explicit_batch(x0s)
+        for i in range(n_test):
+            x0 = x0s[i:i+1,:].T
+            u_explicit, V_explicit = controller.feedforward_explicit(x0)
+            u_explicit = np.vstack(u_explicit).flatten()
+            if np.isnan(V_explicit):
+                self.assertEqual(indices[i], -1)
+                self.assertTrue(all(np.isnan(u_batch[i,:])))
+                self.assertTrue(np.isnan(V_batch[i]))
+            else:
+                self.assertTrue(controller.critical_regions.elements[indices[i]].applies_to(x0))
+                self.assertTrue(np.allclose(u_explicit, u_batch[i,:]))
+                self.assertTrue(np.allclose(u_explicit[:sys.n_u], u_first[i,:]))
+                self.assertTrue(np.isclose(V_explicit, V_batch[i]))
+
+    def test_neighbor_walk(self):
+        sys, controller = double_integrator_controller()
+        controller.get_explicit_solution()
+
+        # symmetric adjacency graph of the critical regions
+        critical_regions = controller.critical_regions
+        self.assertEqual(len(critical_regions.neighbors), len(critical_regions))
+        for i, neighbors in enumerate(critical_regions.neighbors):
+            self.assertEqual(len(neighbors), len(critical_regions.elements[i].polytope.minimal_facets))
+            for j in [j for facet_neighbors in neighbors for j in facet_neighbors]:
+                self.assertTrue(any(i in facet_neighbors for facet_neighbors in critical_regions.neighbors[j]))
+
+        # neighbor walk in closed loop vs cold lookup
+        x0 = np.array([[.9],[-.2]])
+        for k in range(20):
+            u_warm, V_warm = controller.feedforward_explicit(x0, warm_start=True)
+            u_cold, V_cold = controller.feedforward_explicit(x0)
+            self.assertTrue(np.allclose(np.vstack(u_warm), np.vstack(u_cold)))
+            self.assertTrue(np.isclose(V_warm, V_cold))
+            x0 = sys.A.dot(x0) + sys.B.dot(u_warm[0])
+
+    def test_merge_critical_regions(self):
+        np.random.seed(1)
+        sys, controller = double_integrator_controller()
+        controller.get_explicit_solution()
+        n_test = 100
+
+        # merged critical regions
+        controller.merge_critical_regions()
+        self.assertTrue(len(controller.merged_critical_regions) <= len(controller.critical_regions))
+        for i in range(n_test):
+            x0 = np.random.rand(2,1)
+            u_merged = controller.feedback_explicit(x0)
+            u_explicit = controller.feedforward_explicit(x0)[0][0]
+            if any(np.isnan(u_explicit)):
+                self.assertTrue(all(np.isnan(u_merged)))
+            else:
+                self.assertTrue(np.allclose(u_merged, u_explicit))
+
+    def test_flat_storage(self):
+        np.random.seed(1)
+        sys, controller = double_integrator_controller()
+        controller.get_explicit_solution()
+        n_test = 100
+
+        # flat storage of the explicit solution
+        x0s = np.random.rand(n_test, 2)
+        indices, u_first, u_batch, V_batch = controller.feedforward_explicit_batch(x0s)
+        directory_name = tempfile.mkdtemp()
+        controller.explicit_solution.save(directory_name)
+        uploaded_solution = upload_ExplicitSolution(directory_name)
+        uploaded_batch = uploaded_solution.evaluate(x0s)
+        self.assertTrue(np.array_equal(indices, uploaded_batch[0]))
+        self.assertTrue(np.allclose(u_batch, uploaded_batch[2], equal_nan=True))
+        self.assertTrue(np.allclose(V_batch, uploaded_batch[3], equal_nan=True))
+        shutil.rmtree(directory_name)
+
+    def test_runtime_controller(self):
+        np.random.seed(1)
+        sys, controller = double_integrator_controller()
+        controller.get_explicit_solution()
+        n_test = 100
+
+        # runtime evaluator of the exported solution
+        directory_name = tempfile.mkdtemp()
+        controller.export_explicit_solution(directory_name)
+        runtime_controller = ExplicitController(directory_name)
+        for i in range(n_test):
+            x0 = np.random.rand(2,1)
+            u_runtime, V_runtime = runtime_controller.feedforward(x0)
+            u_explicit, V_explicit = controller.feedforward_explicit(x0)
+            self.assertTrue(np.allclose(np.vstack(u_runtime), np.vstack(u_explicit), equal_nan=True))
+            self.assertTrue(np.allclose(runtime_controller.feedback(x0), u_explicit[0], equal_nan=True))
+            self.assertTrue(np.isclose(V_runtime, V_explicit, equal_nan=True))
+        shutil.rmtree(directory_name)
+
+    def test_parallel_exploration(self):
+
+        # serial vs parallel computation of the critical regions
+        serial_solution = MPQPSolver(small_mpqp())
+        for n_processes in [2, 4]:
+            parallel_solution = MPQPSolver(small_mpqp(), n_processes=n_processes)
+            self.assertEqual(sorted(cr.active_set for cr in parallel_solution.critical_regions), sorted(cr.active_set for cr in serial_solution.critical_regions))
+            self.assertEqual(active_set_graph(parallel_solution.critical_regions), active_set_graph(serial_solution.critical_regions))
+        self.assertEqual(multiprocessing.active_children(), [])
+
+        # workers stopped when the exploration fails
+        region_of_interest = Polytope.from_bounds(np.array([[-4.],[-1.]]), np.array([[-3.],[1.]]))
+        region_of_interest.assemble()
+        self.assertRaises(ValueError, MPQPSolver, small_mpqp(3.), n_processes=2, region_of_interest=region_of_interest)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_checkpoint(self):
+        active_sets = sorted(cr.active_set for cr in MPQPSolver(small_mpqp()).critical_regions)
+
+        # interrupted and resumed exploration
+        directory_name = tempfile.mkdtemp()
+        checkpoint_name = os.path.join(directory_name, 'checkpoint')
+        interrupted_solution = MPQPSolver(small_mpqp(), checkpoint_name=checkpoint_name, time_limit=0.)
+        self.assertFalse(interrupted_solution.complete)
+        self.assertTrue(len(interrupted_solution.critical_regions) < len(active_sets))
+        resumed_solution = MPQPSolver(small_mpqp(), checkpoint_name=checkpoint_name)
+        self.assertTrue(resumed_solution.complete)
+        self.assertEqual(sorted(cr.active_set for cr in resumed_solution.critical_regions), active_sets)
+
+        # checkpoint of a different mpQP or region of interest
+        self.assertRaises(ValueError, MPQPSolver, small_mpqp(1.), checkpoint_name=checkpoint_name)
+        region_of_interest = Polytope.from_bounds(-np.ones((2,1)), np.ones((2,1)))
+        region_of_interest.assemble()
+        self.assertRaises(ValueError, MPQPSolver, small_mpqp(), checkpoint_name=checkpoint_name, region_of_interest=region_of_interest)
+
+        # checkpoint with a region of interest
+        checkpoint_name = os.path.join(directory_name, 'checkpoint_region_of_interest')
+        MPQPSolver(small_mpqp(), checkpoint_name=checkpoint_name, time_limit=0., region_of_interest=region_of_interest)
+        self.assertTrue(MPQPSolver(small_mpqp(), checkpoint_name=checkpoint_name, region_of_interest=region_of_interest).complete)
+        self.assertRaises(ValueError, MPQPSolver, small_mpqp(), checkpoint_name=checkpoint_name)
+        shutil.rmtree(directory_name)
+
+    def test_region_of_interest(self):
+        np.random.seed(1)
+        n_test = 100
+
+        # explicit solution restricted to a region of interest
+        critical_regions = MPQPSolver(small_mpqp()).critical_regions
+        region_of_interest = Polytope.from_bounds(.3*np.ones((2,1)), np.ones((2,1)))
+        region_of_interest.assemble()
+        critical_regions_roi = MPQPSolver(small_mpqp(), region_of_interest=region_of_interest).critical_regions
+        self.assertTrue(len(critical_regions_roi) < len(critical_regions))
+        for cr in critical_regions_roi:
+            self.assertTrue(region_of_interest.applies_to(cr.polytope.center))
+        for i in range(n_test):
+            x0 = .3 + .7*np.random.rand(2,1)
+            cr = critical_regions.lookup(x0)
+            cr_roi = critical_regions_roi.lookup(x0)
+            if cr is None:
+                self.assertTrue(cr_roi is None)
+            else:
+                self.assertEqual(cr.active_set, cr_roi.active_set)
+
+        # region of interest with an unfeasible center
+        qp = small_mpqp(3.)
+        critical_regions = MPQPSolver(qp).critical_regions
+        region_of_interest = Polytope.from_bounds(np.array([[-4.],[-1.]]), np.array([[-2.],[1.]]))
+        region_of_interest.assemble()
+        solver = MPQPSolver(qp, region_of_interest=region_of_interest)
+        self.assertEqual(solver.active_set_in(region_of_interest.center), [])
+        self.assertTrue(len(solver.critical_regions) > 0)
+        for i in range(n_test):
+            x0 = np.array([[-4.],[-1.]]) + 2.*np.random.rand(2,1)
+            cr = critical_regions.lookup(x0)
+            cr_roi = solver.critical_regions.lookup(x0)
+            if cr is None:
+                self.assertTrue(cr_roi is None)
+            else:
+                self.assertEqual(cr.active_set, cr_roi.active_set)
+
+        # region of interest outside the feasible set
+        region_of_interest = Polytope.from_bounds(np.array([[-4.],[-1.]]), np.array([[-3.],[1.]]))
+        region_of_interest.assemble()
+        self.assertRaises(ValueError, MPQPSolver, qp, region_of_interest=region_of_interest)
+
+    def test_gram_factor_updates(self):
+        qp = small_mpqp()
+        critical_regions = MPQPSolver(qp).critical_regions
+
+        # factors updated from the parents vs factors computed from scratch
+        for cr in critical_regions:
+            [order, L] = cr.gram_factor
+            self.assertEqual(sorted(order), cr.active_set)
+            self.assertTrue(np.allclose(L.dot(L.T), qp.G_tilde[order,:].dot(qp.G_tilde[order,:].T)))
+            cr_from_scratch = CriticalRegion(cr.active_set, qp)
+            for name in ['lambda_A_offset', 'lambda_A_linear', 'z_offset', 'z_linear', 'V_quadratic', 'V_linear', 'V_offset']:
+                self.assertTrue(np.allclose(getattr(cr, name), getattr(cr_from_scratch, name)))
+
+    def test_cache(self):
+        # critical regions read from the cache
+        directory_name = tempfile.mkdtemp()
+        cache = CriticalRegionCache(directory_name)
+        cold_solution = MPQPSolver(small_mpqp(), cache=cache)
+        warm_solution = MPQPSolver(small_mpqp(), cache=cache)
+        self.assertEqual(cold_solution.cache_hits, 0)
+        self.assertTrue(warm_solution.cache_hits >= len(warm_solution.critical_regions))
+        self.assertTrue(len(os.listdir(directory_name)) >= len(warm_solution.critical_regions))
+        computed = dict((tuple(cr.active_set), cr) for cr in cold_solution.critical_regions)
+        self.assertEqual(sorted(computed.keys()), sorted(tuple(cr.active_set) for cr in warm_solution.critical_regions))
+        for cr in warm_solution.critical_regions:
+            self.assertTrue(np.allclose(cr.u_offset, computed[tuple(cr.active_set)].u_offset))
+            self.assertTrue(np.allclose(cr.u_linear, computed[tuple(cr.active_set)].u_linear))
+        self.assertEqual(active_set_graph(warm_solution.critical_regions), active_set_graph(cold_solution.critical_regions))
+        self.assertFalse(warm_solution.parents)
+        shutil.rmtree(directory_name)
+
+    def test_solver_statistics(self):
+        # solver statistics
+        solution = MPQPSolver(small_mpqp(), statistics=True)
+        statistics = solution.statistics
+        self.assertEqual(statistics.counters['explored_critical_regions'], len(solution.critical_regions))
+        self.assertTrue(statistics.counters['critical_regions_computed'] >= len(solution.critical_regions))
+
+        # LPs counted where they are solved
+        self.assertTrue(statistics.counters['chebyshev_lps'] <= statistics.counters['critical_regions_computed'])
+        self.assertTrue(statistics.counters['boundedness_lps'] <= statistics.counters['critical_regions_computed'] - statistics.counters.get('empty_critical_regions', 0))
+        self.assertEqual(statistics.counters.get('facet_chebyshev_lps', 0), sum(cr.polytope.n_facet_lps for cr in solution.critical_regions))
+        self.assertTrue(MPQPSolver(small_mpqp()).statistics is None)
+        directory_name = tempfile.mkdtemp()
+        file_name = os.path.join(directory_name, 'statistics.json')
+        statistics.save(file_name)
+        self.assertEqual(upload_SolverStatistics(file_name).counters, statistics.counters)
+        shutil.rmtree(directory_name)
+
+    def test_mplp(self):
+        np.random.seed(1)
+        n_test = 100
+
+        # explicit vs implicit solution of the 1-norm controller (inputs can differ in case of dual degeneracy)
+        sys, controller = double_integrator_controller('one')
+        controller.get_explicit_solution()
+        for i in range(n_test):
+            x0 = np.random.rand(2,1)
+            V_explicit = controller.feedforward_explicit(x0)[1]
+            V_implicit = controller.feedforward(x0)[1]
+            if np.isnan(V_implicit):
+                self.assertTrue(np.isnan(V_explicit))
+            else:
+                self.assertTrue(np.isclose(V_explicit, V_implicit, rtol=1.e-4))
+
+    def test_implicit_warm_start(self):
+        sys, controller = double_integrator_controller()
+        controller.get_explicit_solution()
+
+        # implicit solution warm started from the previous active set in closed loop
+        x0 = np.array([[.9],[-.2]])
+        for k in range(20):
+            u_warm, V_warm = controller.feedforward(x0, warm_start=True)
+            u_explicit, V_explicit = controller.feedforward_explicit(x0)
+            self.assertTrue(np.allclose(np.vstack(u_warm), np.vstack(u_explicit), rtol=1.e-4))
+            self.assertTrue(np.isclose(V_warm, V_explicit))
+            x0 = sys.A.dot(x0) + sys.B.dot(u_warm[0])
+
     def test_HybridModelPredictiveController(self):
         np.random.seed(1)
 
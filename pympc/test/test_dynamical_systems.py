@@ -124,5 +124,30 @@ class TestDynamicalSystems(unittest.TestCase):
         # compare the 2 simulations
         self.assertTrue(all(np.isclose(x_sim_1.flatten(), x_sim_2.flatten())))
 
+        # domains of many pairs (x,u) vs domains of the single pairs
+        np.random.seed(1)
+        x = np.multiply(np.random.rand(2, 100) - .5, np.array([[.6],[4.]]))
+        u = 10.*(np.random.rand(1, 100) - .5)
+        domains = sys.find_domains(x, u)
+        self.assertEqual(domains.shape, (100,))
+        for j in range(100):
+            domain = sys.find_domain(x[:,j:j+1], u[:,j:j+1])
+            if domain is None:
+                self.assertEqual(domains[j], -1)
+            else:
+                self.assertEqual(domains[j], domain)
+        self.assertEqual(sys.find_domains(x_0, u_list[0]).tolist(), [sys.find_domain(x_0, u_list[0])])
+
+        # random states checked in batches or one by one
+        x = sys.random_state()
+        self.assertEqual(x.shape, (2,1))
+        self.assertTrue(np.all(x >= sys.x_min) and np.all(x <= sys.x_max))
+        check_batch = lambda x: x[0,:] > .15
+        check_state = lambda x: float(x[0,0]) > .15
+        for check_sample_function, batch_check in [(check_batch, True), (check_state, False)]:
+            x = sys.random_state(check_sample_function, batch_check=batch_check)
+            self.assertEqual(x.shape, (2,1))
+            self.assertTrue(.15 < x[0,0] <= sys.x_max[0,0])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -92,6 +92,57 @@ class TestGeometry(unittest.TestCase):
         for i in range(0, len(true_facet_centers)):
             self.assertTrue(all(np.isclose(true_facet_centers[i], p.facet_centers(i))))
 
+        # coincident facets of a large polytope (same result as the comparison of all the pairs of facets)
+        np.random.seed(1)
+        A_large = np.random.randn(200, 3)
+        A_large = np.vstack((A_large, A_large[:50,:]*(1.+1.e-11), np.zeros((10,3))))
+        b_large = np.vstack((np.ones((200,1)), np.ones((50,1)), np.zeros((5,1)), np.ones((5,1))))
+        p_large = Polytope(A_large, b_large)
+        p_large.assemble(check_emptiness=False, check_boundedness=False)
+        Ab = np.hstack((p_large.A, p_large.b))
+        true_coincident_facets = [np.where(np.all(np.isclose(Ab, Ab[i,:], 1e-9, 1e-9), axis=1))[0].tolist() for i in range(Ab.shape[0])]
+        self.assertEqual(p_large.coincident_facets, true_coincident_facets)
+        self.assertEqual(p_large.coincident_facets[0], [0, 200])
+        self.assertEqual(p_large.coincident_facets[250], range(250, 255))
+
+        # screening of redundant facets (zero rows, bounding box and known facets)
+        A = np.vstack((A, np.zeros((1,2)), np.array([[1.,0.]])))
+        b = np.vstack((b, np.ones((1,1)), 5.*np.ones((1,1))))
+        p = Polytope(A,b)
+        p.assemble(known_facets=[2], screening=True)
+        self.assertEqual(true_minimal_facets, p.minimal_facets)
+
+        # Clarkson's algorithm
+        p = Polytope(A,b)
+        p.assemble(known_facets=[2], screening=True, redundancy_method='clarkson')
+        self.assertEqual(true_minimal_facets, p.minimal_facets)
+        np.random.seed(1)
+        A_large = np.random.randn(100, 3)
+        b_large = np.random.rand(100, 1) + 1.
+        minimal_facets = []
+        for method in ['lp', 'clarkson']:
+            p_large = Polytope(A_large, b_large)
+            p_large.assemble(check_redundancy=True, redundancy_method=method)
+            minimal_facets.append(p_large.minimal_facets)
+        self.assertEqual(minimal_facets[0], minimal_facets[1])
+
+        # lazy assembly (the properties are computed at the first access)
+        p = Polytope(A,b)
+        p.assemble(check_emptiness=False, check_boundedness=False)
+        self.assertEqual(p.assembly_times, dict())
+        self.assertTrue(p.applies_to(np.array([[0.],[0.]])))
+        self.assertFalse(p.applies_to(np.array([[0.],[2.]])))
+        self.assertEqual(p.assembly_times, dict())
+        x = np.array([[0., 0., .5, -2.],[0., 2., -.9, 0.]])
+        self.assertEqual(p.applies_to(x).tolist(), [True, False, True, False])
+        self.assertEqual(true_minimal_facets, p.minimal_facets)
+        self.assertEqual(p.applies_to(x).tolist(), [True, False, True, False])
+        self.assertEqual(sorted(p.assembly_times.keys()), ['redundancy'])
+        self.assertFalse(p.empty)
+        self.assertTrue(p.bounded)
+        self.assertFalse(np.isnan(p.radius))
+        self.assertEqual(p.lhs_min.shape, (3,2))
+
         # from_ and add_ methods
         x_max = np.ones((2,1))
         x_min = -x_max
@@ -133,6 +184,23 @@ class TestGeometry(unittest.TestCase):
         self.assertFalse(p1.included_in(p3))
         self.assertFalse(p1.included_in(p4))
 
+        # number of LPs solved
+        p = Polytope.from_bounds(-np.ones((2,1)), np.ones((2,1)))
+        p.assemble()
+        self.assertEqual([p.n_chebyshev_lps, p.n_boundedness_lps, p.n_facet_lps], [1, 1, 0])
+        for i in range(len(p.minimal_facets)):
+            p.facet_centers(i)
+            p.facet_radii(i)
+        self.assertEqual(p.n_facet_lps, len(p.minimal_facets))
+        p = Polytope(np.array([[1.,0.],[0.,1.]]), np.ones((2,1)))
+        p.assemble(check_boundedness=False)
+        self.assertFalse(p.bounded)
+        self.assertEqual([p.n_chebyshev_lps, p.n_boundedness_lps], [1, 0])
+        p = Polytope(np.array([[0.,0.],[1.,0.]]), np.array([[-1.],[1.]]))
+        p.assemble()
+        self.assertTrue(p.empty)
+        self.assertEqual(p.n_chebyshev_lps, 0)
+
         # # test fourier_motzkin_elimination
         # lhs = np.array([[1.,1.],[-1.,1.],[-1.,-9.]])
         # rhs = np.array([[1.],[3.],[3.]])
@@ -276,6 +344,34 @@ class TestGeometry(unittest.TestCase):
         for ab in Ab:
             self.assertTrue(any([np.allclose(ab_real, ab) for ab_real in Ab_real]))
 
+    def test_sample(self):
+        np.random.seed(1)
+
+        # samples in a box
+        x_min = - np.ones((3,1))
+        x_max = np.array([[3.],[1.],[1.]])
+        p = Polytope.from_bounds(x_min, x_max)
+        p.assemble()
+        samples = p.sample(2000)
+        self.assertEqual(samples.shape, (3, 2000))
+        self.assertTrue(np.all(p.applies_to(samples)))
+        self.assertTrue(np.allclose(np.mean(samples, axis=1), [1., 0., 0.], atol=.1))
+
+        # samples in a triangle from a given starting point
+        A = np.array([[-1.,0.],[0.,-1.],[1.,1.]])
+        b = np.array([[0.],[0.],[1.]])
+        p = Polytope(A, b)
+        p.assemble(check_emptiness=False, check_boundedness=False)
+        samples = p.sample(5000, x0=np.array([[.1],[.1]]))
+        self.assertTrue(np.all(p.applies_to(samples)))
+        self.assertTrue(np.allclose(np.mean(samples, axis=1), [1./3., 1./3.], atol=.02))
+
+        # unbounded polyhedron
+        p = Polytope(A[:2,:], b[:2,:])
+        p.assemble(check_boundedness=False)
+        with self.assertRaises(ValueError):
+            p.sample(10, x0=np.ones((2,1)))
+
     def test_point_in_convex_hull(self):
         np.random.seed(1)
 
@@ -1,7 +1,12 @@
 import unittest
 import numpy as np
+from scipy.optimize import nnls
 from pympc.optimization.pnnls import linear_program as lp_pnnls
+from pympc.optimization.pnnls import linear_program_batch
 from pympc.optimization.pnnls import quadratic_program as qp_pnnls
+from pympc.optimization.pnnls import QuadraticProgram
+from pympc.optimization.dual_active_set import quadratic_program as qp_dual_active_set
+from pympc.optimization import backends
 from pympc.optimization.gurobi import linear_program as lp_gurobi
 from pympc.optimization.gurobi import quadratic_program as qp_gurobi
 
@@ -149,6 +154,57 @@ class TestMPCTools(unittest.TestCase):
                 # self.assertTrue(sol_pnnls.primal_degenerate == sol_gurobi.primal_degenerate)
                 # self.assertTrue(sol_pnnls.dual_degenerate == sol_gurobi.dual_degenerate)
 
+        # lps with the same structure (gurobi reuses the same model)
+        A = np.vstack((np.random.randn(10, 5), np.eye(5), -np.eye(5)))
+        for i in range(20):
+            A_i = A*(1. + .1*np.random.rand(*A.shape)) if i%2 else A
+            f = np.random.randn(5, 1)
+            b = np.random.rand(A.shape[0], 1)
+            sol_pnnls = lp_pnnls(f, A_i, b)
+            sol_gurobi = lp_gurobi(f, A_i, b)
+            self.assertTrue(np.isclose(sol_pnnls.min, sol_gurobi.min))
+            self.assertTrue(np.allclose(sol_pnnls.inequality_multipliers, sol_gurobi.inequality_multipliers))
+
+    def test_linear_program_batch(self):
+        np.random.seed(1)
+
+        # bounded, infeasible (x_2 <= 0 and x_2 >= 1) and unbounded (x_1 unbounded from below) columns
+        A = np.array([[1.,0.],[0.,1.],[0.,-1.]])
+        F = np.array([[-1.,-1.,1.],[1.,1.,1.]])
+        B = np.array([[1.,1.,1.],[1.,0.,1.],[1.,-1.,1.]])
+        sols = linear_program_batch(F, A, B)
+        self.assertEqual(len(sols), 3)
+        self.assertTrue(np.allclose(sols[0].argmin, np.array([[1.],[-1.]])))
+        self.assertTrue(np.isclose(sols[0].min, -2.))
+        for j in [1, 2]:
+            self.assertTrue(np.isnan(sols[j].min))
+            self.assertTrue(all(np.isnan(sols[j].argmin)))
+            self.assertTrue(sols[j].active_set is None)
+        for j, sol in enumerate(sols):
+            sol_pnnls = lp_pnnls(F[:,j:j+1], A, B[:,j:j+1])
+            self.assertTrue(np.isclose(sol.min, sol_pnnls.min, equal_nan=True))
+            self.assertTrue(np.allclose(sol.argmin, sol_pnnls.argmin, equal_nan=True))
+            self.assertEqual(sol.active_set, sol_pnnls.active_set)
+
+        # random batches of LPs with the same constraint matrix
+        for i in range(10):
+            n_variables = np.random.randint(2, 10)
+            n_ineq = np.random.randint(1, 20)
+            n_lps = np.random.randint(1, 20)
+            A = np.vstack((np.random.randn(n_ineq, n_variables), np.eye(n_variables), -np.eye(n_variables)))
+            F = np.random.randn(n_variables, n_lps)
+            B = np.random.rand(A.shape[0], n_lps) - .1
+            sols = linear_program_batch(F, A, B)
+            self.assertEqual(len(sols), n_lps)
+            for j, sol in enumerate(sols):
+                sol_pnnls = lp_pnnls(F[:,j:j+1], A, B[:,j:j+1])
+                if np.isnan(sol_pnnls.min):
+                    self.assertTrue(np.isnan(sol.min))
+                    self.assertTrue(all(np.isnan(sol.argmin)))
+                else:
+                    self.assertTrue(np.isclose(sol.min, sol_pnnls.min))
+                    self.assertTrue(np.allclose(A.dot(sol.argmin), A.dot(sol_pnnls.argmin)))
+
     def test_quadratic_program(self):
         np.random.seed(1)
 
@@ -195,5 +251,115 @@ class TestMPCTools(unittest.TestCase):
                 self.assertTrue(np.allclose(sol_pnnls.argmin, sol_gurobi.argmin,1.e-3,1.e-5))
                 self.assertTrue(np.isclose(sol_pnnls.min, sol_gurobi.min,1.e-3,1.e-5))
 
+    def test_quadratic_program_factorization(self):
+        np.random.seed(1)
+
+        def stateless_quadratic_program(H, f, A, b, tol=1.e-7):
+            # PNNLS solution of the QP with the factorizations computed from scratch
+            n_x = H.shape[1]
+            M = A.dot(np.linalg.inv(np.linalg.cholesky(H).T))
+            d = b + A.dot(np.linalg.inv(H)).dot(f)
+            lhs_nnls = np.vstack((-M.T,-d.T))
+            rhs_nnls = np.vstack((np.zeros((n_x,1)),1.))
+            y_star = np.reshape(nnls(lhs_nnls, rhs_nnls.flatten())[0], (A.shape[0],1))
+            if np.linalg.norm(lhs_nnls.dot(y_star) - rhs_nnls) < tol:
+                return [np.full((n_x,1), np.nan), np.nan]
+            x_star = -np.linalg.inv(H).dot(f+A.T.dot(y_star)/(1.+d.T.dot(y_star)))
+            return [x_star, (0.5 * x_star.T.dot(H).dot(x_star) + f.T.dot(x_star))[0,0]]
+
+        # qps with the same hessian and constraint matrix
+        n_variables = 20
+        n_ineq = 30
+        H = np.random.random((n_variables,n_variables))
+        H = H.T.dot(H)+np.eye(n_variables)*1.e-3
+        A = np.vstack((np.random.randn(n_ineq, n_variables), np.eye(n_variables)[:1,:], -np.eye(n_variables)[:1,:]))
+        qp = QuadraticProgram(H, A)
+        for i in range(20):
+            f = np.random.randn(n_variables, 1)
+            b = np.random.rand(n_ineq + 2, 1) - .2
+
+            # infeasible qp (x_1 <= -1 and x_1 >= 1)
+            if i == 0:
+                b[-2:] = -1.
+            sol = qp.solve(f, b)
+            [argmin, cost_min] = stateless_quadratic_program(H, f, A, b)
+            if i == 0:
+                self.assertTrue(np.isnan(sol.min))
+                self.assertTrue(all(np.isnan(sol.argmin)))
+            if np.isnan(cost_min):
+                self.assertTrue(np.isnan(sol.min))
+            else:
+                self.assertTrue(np.allclose(sol.argmin, argmin, 1.e-3, 1.e-5))
+                self.assertTrue(np.isclose(sol.min, cost_min, 1.e-3, 1.e-5))
+
+    def test_dual_active_set(self):
+        np.random.seed(1)
+
+        # random qps
+        for i in range(100):
+            n_variables = np.random.randint(2, 30)
+            n_ineq = np.random.randint(1, 60)
+            H = np.random.randn(n_variables, n_variables)
+            H = H.T.dot(H) + np.eye(n_variables)*1.e-2
+            H_inv = np.linalg.inv(H)
+            f = np.random.randn(n_variables, 1)
+            A = np.random.randn(n_ineq, n_variables)
+            b = np.random.rand(n_ineq, 1) - .3
+            sol = qp_dual_active_set(H_inv, f, A, b)
+            sol_pnnls = qp_pnnls(H, f, A, b)
+            if np.isnan(sol_pnnls.min):
+                self.assertTrue(np.isnan(sol.min))
+                self.assertTrue(all(np.isnan(sol.argmin)))
+                self.assertTrue(sol.active_set is None)
+            else:
+                self.assertTrue(np.allclose(sol.argmin, sol_pnnls.argmin, 1.e-3, 1.e-5))
+                self.assertTrue(np.isclose(sol.min, sol_pnnls.min, 1.e-3, 1.e-5))
+                self.assertTrue(np.allclose(H.dot(sol.argmin) + f + A.T.dot(sol.inequality_multipliers), 0.))
+
+                # warm start with the optimal active set
+                sol_warm = qp_dual_active_set(H_inv, f, A, b, sol.active_set)
+                self.assertEqual(sol_warm.iterations, 0)
+                self.assertTrue(np.allclose(sol_warm.argmin, sol.argmin))
+
+                # warm start with a perturbed right-hand side
+                b_perturbed = b + 1.e-3*np.random.randn(n_ineq, 1)
+                sol_warm = qp_dual_active_set(H_inv, f, A, b_perturbed, sol.active_set)
+                sol_cold = qp_dual_active_set(H_inv, f, A, b_perturbed)
+                self.assertTrue(np.allclose(sol_warm.argmin, sol_cold.argmin, equal_nan=True))
+
+    def test_backends(self):
+        np.random.seed(1)
+
+        # pnnls is always available and it is selected for small problems
+        self.assertTrue('pnnls' in backends.available_backends('lp'))
+        self.assertTrue('pnnls' in backends.available_backends('qp'))
+        self.assertEqual(backends.select_backend('lp', 10), 'pnnls')
+        self.assertFalse('scipy' in backends.available_backends('qp'))
+        self.assertRaises(ValueError, backends.set_default_backend, 'unknown_backend')
+
+        # same solution from all the available lp backends
+        A = np.vstack((np.random.randn(20, 5), np.eye(5), -np.eye(5)))
+        b = np.random.rand(A.shape[0], 1)
+        f = np.random.randn(5, 1)
+        sol_pnnls = lp_pnnls(f, A, b)
+        for backend in backends.available_backends('lp'):
+            sol = backends.linear_program(f, A, b, backend=backend)
+            self.assertTrue(np.isclose(sol.min, sol_pnnls.min))
+            self.assertTrue(np.allclose(sol.argmin, sol_pnnls.argmin, atol=1.e-6))
+
+        # default backend
+        backends.set_default_backend('pnnls')
+        self.assertEqual(backends.get_default_backend(), 'pnnls')
+        self.assertTrue(np.isclose(backends.linear_program(f, A, b).min, sol_pnnls.min))
+        backends.set_default_backend('auto')
+
+        # new backend registered with a size limit
+        backends.register_backend('small_pnnls', 'pympc.optimization.pnnls', max_size=5)
+        self.assertTrue('small_pnnls' in backends.available_backends('lp'))
+        others = [name for name in backends.available_backends() if name != 'small_pnnls']
+        self.assertEqual(backends.select_backend('lp', 1, exclude=others), 'small_pnnls')
+        self.assertTrue(np.isclose(backends.linear_program(f, A, b, backend='small_pnnls').min, sol_pnnls.min))
+        del backends._backends['small_pnnls']
+
 if __name__ == '__main__':
     unittest.main()